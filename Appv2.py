@@ -1,14 +1,20 @@
 import os
-import gradio as gr
-from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
+from crewai import Crew
 from langchain_community.tools import DuckDuckGoSearchRun, DuckDuckGoSearchResults
-from crewai_tools import tool, SeleniumScrapingTool, ScrapeWebsiteTool
+from crewai_tools import tool, SeleniumScrapingTool
 import asyncio
 from langchain_community.output_parsers.rail_parser import GuardrailsOutputParser
-import json
+from search_cache import search_cache
+from instrumentation import metrics, traced_tool
+from scraper import scraper
+from doc_store import doc_store
+from progress import RunProgress, task_labels
+from jobs import JobQueue, follow_job
+from report_cache import config_key, report_cache
+from config_registry import AgentRegistry
 # Define the DuckDuckGoSearch tool using the decorator for tool registration
 @tool('DuckDuckGoSearch')
+@traced_tool('DuckDuckGoSearch')
 def search(search_query: str):
     """
     This function uses DuckDuckGoSearch tool to search for the given query.
@@ -17,12 +23,13 @@ def search(search_query: str):
     search_query (str): The query to search for.
     
     Returns:
-    The search results.
+    The search results, served from the shared search cache when available.
     """
-    return DuckDuckGoSearchRun().run(search_query)
+    return search_cache.get_or_fetch('DuckDuckGoSearch', search_query, lambda query: DuckDuckGoSearchRun().run(query))
 
 # Define the DuckDuckGoSearch tool
 @tool('DuckDuckGoResults')
+@traced_tool('DuckDuckGoResults')
 def search_results(search_query: str):
     """
     This function uses DuckDuckGoResults tool to get the search results.
@@ -31,17 +38,16 @@ def search_results(search_query: str):
     search_query (str): The query to get results for.
     
     Returns:
-    The search results.
+    The search results, served from the shared search cache when available.
     """
-    return DuckDuckGoSearchResults().run(search_query)
+    return search_cache.get_or_fetch('DuckDuckGoResults', search_query, lambda query: DuckDuckGoSearchResults().run(query))
 
 
 
 # Define the WebScrapper tool
 @tool('WebScrapper')
-
+@traced_tool('WebScrapper')
 def web_scrapper(url: str):
-
     """
     Scrape content from a specified URL using a web scraping tool.
     
@@ -49,53 +55,80 @@ def web_scrapper(url: str):
     url (str): The URL to scrape.
 
     Returns:
-    ScrapeWebsiteTool: An object containing the scraped data.
+    The text content of the page.
     """
-    return ScrapeWebsiteTool(website_url=url)
-
-
-def load_agents_and_tasks_from_json(file_path):
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-        agents = []
-        tasks = []
-
-        for agent_data in data['agents']:
-            agent = Agent(
-                role=agent_data['role'],
-                goal=agent_data['goal'],
-                tools=[globals()[tool_name] for tool_name in agent_data['tools']],
-                llm=ChatGroq(temperature=0, groq_api_key="YOUR KEY", model_name="llama3-70b-8192"),
-                 backstory=agent_data['backstory'],
-                allow_delegation=agent_data['allow_delegation'],
-                max_iter=agent_data['max_iter'],
-                verbose=agent_data['verbose'],
-            )
-            for task_data in agent_data['tasks']:
-                task = Task(
-                    description=task_data['description'],
-                    expected_output=task_data['expected_output'],
-                    agent=agent
-                )
-                tasks.append(task)
-            agents.append(agent)
-        return agents, tasks
-
-def kickoff_crew(topic: str, selected_agent_role: str, agents, tasks):
-    selected_agent = [agent for agent in agents if agent.role == selected_agent_role][0]
-    selected_tasks = [task for task in tasks if task.agent.role == selected_agent_role]
-    crew = Crew(agents=[selected_agent], tasks=selected_tasks)
+    return scraper.scrape_to_text([url])
+
+# Define the BatchWebScrapper tool
+@tool('BatchWebScrapper')
+@traced_tool('BatchWebScrapper')
+def batch_web_scrapper(urls: str):
+    """
+    Scrape the content of several URLs at once. Prefer this over WebScrapper when there is more than one URL.
+    
+    Args:
+    urls (str): The URLs to scrape, separated by commas or new lines.
+
+    Returns:
+    The text content of every page, one section per URL.
+    """
+    return scraper.scrape_to_text(urls)
+
+# Define the LocalDocumentSearch tool
+@tool('LocalDocumentSearch')
+@traced_tool('LocalDocumentSearch')
+def local_search(search_query: str):
+    """
+    Search the pages scraped in earlier runs. Use it before searching or scraping the web.
+    
+    Args:
+    search_query (str): What to look for.
+
+    Returns:
+    The most relevant stored passages with the URL they were scraped from.
+    """
+    return doc_store.search_to_text(search_query)
+
+
+# Parse agents_and_tasks.json once; agents and tasks are built per request
+registry = AgentRegistry('agents_and_tasks.json', globals())
+
+def kickoff_crew(topic: str, selected_agent_role: str, progress: RunProgress = None):
+    agents, tasks = registry.build([selected_agent_role])
+    callbacks = progress.crew_callbacks(task_labels(tasks)) if progress else {}
+    crew = Crew(agents=agents, tasks=tasks, **callbacks)
     result = crew.kickoff(inputs={'topic': topic})
     return result
 
-async def process_research(topic, selected_agent_role):
-    agents, tasks = load_agents_and_tasks_from_json('agents_and_tasks.json')
-    result = await asyncio.to_thread(kickoff_crew, topic, selected_agent_role, agents, tasks)
+def kickoff_and_store(topic: str, selected_agent_role: str, progress: RunProgress = None):
+    result = kickoff_crew(topic, selected_agent_role, progress)
+    report_cache.store(topic, config_key(registry.config_hash, selected_agent_role), str(result))
     return result
 
+# Crew runs are executed by a background job queue with its own worker pool
+jobs = JobQueue('Appv2', kickoff_and_store)
+
+async def process_research(topic, selected_agent_role, force_refresh=False):
+    if not selected_agent_role:
+        yield "", "Select an agent."
+        return
+    cached = None if force_refresh else report_cache.lookup(topic, config_key(registry.config_hash, selected_agent_role))
+    if cached:
+        yield "", cached.markdown()
+        return
+    job_id = jobs.submit(topic, selected_agent_role)
+    async for update in follow_job(jobs, job_id):
+        yield job_id, update
+
+async def check_job(job_id):
+    async for update in follow_job(jobs, job_id):
+        yield update
+
 async def main():
-    agents, _ = load_agents_and_tasks_from_json('agents_and_tasks.json')
-    agent_roles = [agent.role for agent in agents]
+    # Imported here so that headless entry points (batch.py) start without Gradio
+    import gradio as gr
+    jobs.resume()
+    agent_roles = registry.roles()
 
     with gr.Blocks() as demo:
         gr.Markdown("## CrewAI Research Tool")
@@ -103,18 +136,33 @@ async def main():
         with gr.Tab("Research"):
             topic_input = gr.Textbox(label="Enter Topic", placeholder="Type here...")
             agent_dropdown = gr.Dropdown(label="Select Agent", choices=agent_roles)
+            refresh_checkbox = gr.Checkbox(label="Force refresh (ignore cached reports)")
             submit_button = gr.Button("Start Research")
+            stop_button = gr.Button("Stop")
+            with gr.Row():
+                job_id_input = gr.Textbox(label="Job ID", placeholder="Filled in when a run is submitted")
+                check_button = gr.Button("Check Job")
+            gr.Markdown(jobs.stats_markdown, every=5)
+            with gr.Accordion("Metrics (Prometheus format)", open=False):
+                gr.Code(metrics.render, every=10)
             output = gr.Markdown(label="Result")
             
-            submit_button.click(
+            research_event = submit_button.click(
                 fn=process_research,
-                inputs=[topic_input, agent_dropdown],
+                inputs=[topic_input, agent_dropdown, refresh_checkbox],
+                outputs=[job_id_input, output]
+            )
+            check_event = check_button.click(
+                fn=check_job,
+                inputs=job_id_input,
                 outputs=output
             )
+            stop_button.click(fn=jobs.cancel, inputs=job_id_input, cancels=[research_event, check_event])
             
-            gr.Markdown("### Research\nEnter a topic, select an agent, and click 'Start Research' to initiate the research process. The selected agent will work on gathering information, analyzing data, and generating a comprehensive report on the given topic.")
+            gr.Markdown("### Research\nEnter a topic, select an agent, and click 'Start Research' to initiate the research process. The selected agent will work on gathering information, analyzing data, and generating a comprehensive report on the given topic. Progress is shown as the agent works; click 'Stop' to cancel a run. Topics researched recently are answered from the report cache unless 'Force refresh' is ticked. Each run is queued as a background job: keep its Job ID to check on it with 'Check Job' after reloading the page.")
 
-    demo.queue(api_open=False, max_size=3).launch()
+    # Handlers only follow jobs, so they need no concurrency limit of their own
+    demo.queue(api_open=False, default_concurrency_limit=None).launch()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,14 +1,23 @@
 import os
-import gradio as gr
 from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
 from langchain_community.tools import DuckDuckGoSearchRun, DuckDuckGoSearchResults
-from crewai_tools import tool, SeleniumScrapingTool, ScrapeWebsiteTool
-import asyncio
+from crewai_tools import tool, SeleniumScrapingTool
 from langchain_community.output_parsers.rail_parser import GuardrailsOutputParser
-import json
+from search_cache import search_cache
+from instrumentation import metrics, traced_tool
+from scraper import scraper
+from doc_store import doc_store
+from progress import RunProgress, task_labels
+from jobs import JobQueue, follow_job
+from report_cache import config_key, report_cache
+from checkpoints import checkpoints
+from config_registry import AgentRegistry, with_context
+from executor import run_roles_concurrently
+from scheduler import build_dependencies, run_pipeline
+from compaction import compact_context
 # Define the DuckDuckGoSearch tool using the decorator for tool registration
 @tool('DuckDuckGoSearch')
+@traced_tool('DuckDuckGoSearch')
 def search(search_query: str):
     """
     This function uses DuckDuckGoSearch tool to search for the given query.
@@ -17,12 +26,13 @@ def search(search_query: str):
     search_query (str): The query to search for.
     
     Returns:
-    The search results.
+    The search results, served from the shared search cache when available.
     """
-    return DuckDuckGoSearchRun().run(search_query)
+    return search_cache.get_or_fetch('DuckDuckGoSearch', search_query, lambda query: DuckDuckGoSearchRun().run(query))
 
 # Define the DuckDuckGoSearch tool
 @tool('DuckDuckGoResults')
+@traced_tool('DuckDuckGoResults')
 def search_results(search_query: str):
     """
     This function uses DuckDuckGoResults tool to get the search results.
@@ -31,17 +41,16 @@ def search_results(search_query: str):
     search_query (str): The query to get results for.
     
     Returns:
-    The search results.
+    The search results, served from the shared search cache when available.
     """
-    return DuckDuckGoSearchResults().run(search_query)
+    return search_cache.get_or_fetch('DuckDuckGoResults', search_query, lambda query: DuckDuckGoSearchResults().run(query))
 
 
 
 # Define the WebScrapper tool
 @tool('WebScrapper')
-
+@traced_tool('WebScrapper')
 def web_scrapper(url: str):
-
     """
     Scrape content from a specified URL using a web scraping tool.
     
@@ -49,84 +58,157 @@ def web_scrapper(url: str):
     url (str): The URL to scrape.
 
     Returns:
-    ScrapeWebsiteTool: An object containing the scraped data.
-    llm=ChatGroq(temperature=0, groq_api_key="", model_name="llama3-70b-8192"),
-                
+    The text content of the page.
+    """
+    return scraper.scrape_to_text([url])
+
+# Define the BatchWebScrapper tool
+@tool('BatchWebScrapper')
+@traced_tool('BatchWebScrapper')
+def batch_web_scrapper(urls: str):
+    """
+    Scrape the content of several URLs at once. Prefer this over WebScrapper when there is more than one URL.
+    
+    Args:
+    urls (str): The URLs to scrape, separated by commas or new lines.
+
+    Returns:
+    The text content of every page, one section per URL.
     """
-    return ScrapeWebsiteTool(website_url=url)
-
-def load_agents_and_tasks_from_json(file_path):
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-        agents = []
-        tasks = []
-
-        for agent_data in data['agents']:
-            # Assuming Agent is a dictionary for simplicity. Adjust based on your actual Agent class implementation.
-            agent = {
-                'role': agent_data['role'],
-                'goal': agent_data['goal'],
-                'tools': [globals()[tool_name] for tool_name in agent_data['tools']],
-                'llm': ChatGroq(temperature=0, groq_api_key="YOUR API KEY", model_name="llama3-70b-8192"),
-                'backstory': agent_data['backstory'],
-                'allow_delegation': agent_data['allow_delegation'],
-                'max_iter': agent_data['max_iter'],
-                'verbose': agent_data['verbose'],
-            }
-            agents.append(agent)
-            for task_data in agent_data['tasks']:
-                task = {
-                    'description': task_data['description'],
-                    'expected_output': task_data['expected_output'],
-                    'agent': agent  # Here, we're linking the task to the agent dictionary. Adjust based on your implementation.
-                }
-                tasks.append(task)
-        
-        # Debugging: Print the first agent to verify structure
-        print("First agent loaded:", agents[0])
-
-        return agents, tasks
-async def kickoff_crew(topic: str, selected_agent_roles: list, agents, tasks):
-    results = []
-    for role in selected_agent_roles:
-        selected_agent = next(agent for agent in agents if agent['role'] == role)
-        selected_tasks = [task for task in tasks if task['agent']['role'] == role]
-        crew = Crew(agents=[selected_agent], tasks=selected_tasks)
-        result = crew.kickoff(inputs={'topic': topic})
-        results.append(result)
-    return results
-
-async def process_research(topic, selected_agent_roles):
-    agents, tasks = load_agents_and_tasks_from_json('agents_and_tasks.json')
-    results = await kickoff_crew(topic, selected_agent_roles, agents, tasks)
-    # Assuming results is a list of strings, join them with newline characters
-    formatted_results = "\n".join(results)
-    return formatted_results
-
-def sync_process_research(topic, selected_agent_roles):
-    return asyncio.run(process_research(topic, selected_agent_roles))
+    return scraper.scrape_to_text(urls)
+
+# Define the LocalDocumentSearch tool
+@tool('LocalDocumentSearch')
+@traced_tool('LocalDocumentSearch')
+def local_search(search_query: str):
+    """
+    Search the pages scraped in earlier runs. Use it before searching or scraping the web.
+    
+    Args:
+    search_query (str): What to look for.
+
+    Returns:
+    The most relevant stored passages with the URL they were scraped from.
+    """
+    return doc_store.search_to_text(search_query)
+
+# Parse agents_and_tasks.json once; agents and tasks are built per request
+registry = AgentRegistry('agents_and_tasks.json', globals())
+
+def run_role(topic: str, role: str, upstream: dict = None, progress: RunProgress = None, checkpoint=None):
+    # Upstream results are handed to the role's tasks as context
+    context = "\n\n".join(f"## {name}\n{output}" for name, output in (upstream or {}).items())
+    # Only the most relevant passages and the cited sources are passed downstream
+    context = compact_context(context, topic)
+    agents, tasks = registry.build([role], context=context)
+    labels = task_labels(tasks)
+    # Tasks finished by an earlier attempt of the run are skipped; the last of them feeds the next task
+    restored = []
+    for label in labels if checkpoint else []:
+        output = checkpoint.get(label)
+        if output is None:
+            break
+        restored.append(output)
+    if restored and progress:
+        progress.emit(f"{', '.join(f'**{label}**' for label in labels[:len(restored)])} restored from the checkpoint of an earlier attempt")
+    if len(restored) == len(tasks):
+        return restored[-1]
+    tasks, labels = tasks[len(restored):], labels[len(restored):]
+    if restored:
+        tasks[0].description = with_context(tasks[0].description, restored[-1])
+    callbacks = progress.crew_callbacks(labels) if progress else {}
+    crew = Crew(agents=agents, tasks=tasks, **callbacks)
+    try:
+        return str(crew.kickoff(inputs={'topic': topic}))
+    finally:
+        if checkpoint:
+            checkpoint.save_tasks(dict(zip(labels, tasks)))
+
+def kickoff_crew(topic: str, selected_agent_roles: list, pipeline: bool = False, progress: RunProgress = None, run_id: str = None, resume: bool = True):
+    # Roles (and tasks) that finished in a failed attempt of the same run are not run again
+    checkpoint = checkpoints.open(topic, report_config_hash(selected_agent_roles, pipeline), run_id, resume)
+    if pipeline:
+        # Follow the next_agent/depends_on graph; independent branches run in parallel
+        dependencies = build_dependencies(registry.agent_configs())
+        results = list(run_pipeline(lambda role, upstream: run_role(topic, role, upstream, progress, checkpoint), dependencies, selected_agent_roles).values())
+    else:
+        # Roles are independent, so their crews run side by side
+        results = run_roles_concurrently(lambda role: run_role(topic, role, progress=progress, checkpoint=checkpoint), selected_agent_roles)
+    if not any(isinstance(result, Exception) for result in results):
+        checkpoint.clear()
+    return [f"Error: {str(result)}" if isinstance(result, Exception) else str(result) for result in results]
+
+def report_config_hash(selected_agent_roles: list, pipeline: bool) -> str:
+    return config_key(registry.config_hash, pipeline, *selected_agent_roles)
+
+def kickoff_report(topic: str, selected_agent_roles: list, pipeline: bool = False, resume: bool = True, progress: RunProgress = None):
+    results = kickoff_crew(topic, selected_agent_roles, pipeline, progress, resume=resume)
+    # Results come back in selection order, or dependency order in pipeline mode
+    report = "\n".join(results)
+    # Empty reports and reports with a failed role are not cached
+    if results and not any(result.startswith("Error:") for result in results):
+        report_cache.store(topic, report_config_hash(selected_agent_roles, pipeline), report)
+    return report
+
+# Crew runs are executed by a background job queue with its own worker pool
+jobs = JobQueue('Appv3', kickoff_report)
+
+async def process_research(topic, selected_agent_roles, pipeline=False, force_refresh=False):
+    if not selected_agent_roles:
+        yield "", "Select at least one agent."
+        return
+    cached = None if force_refresh else report_cache.lookup(topic, report_config_hash(selected_agent_roles, pipeline))
+    if cached:
+        yield "", cached.markdown()
+        return
+    # A forced refresh also starts over instead of resuming from task checkpoints
+    job_id = jobs.submit(topic, selected_agent_roles, pipeline, not force_refresh)
+    async for update in follow_job(jobs, job_id):
+        yield job_id, update
+
+async def check_job(job_id):
+    async for update in follow_job(jobs, job_id):
+        yield update
 
 def main():
-    agents, _ = load_agents_and_tasks_from_json('agents_and_tasks.json')
-    agent_roles = [agent['role'] for agent in agents]
+    # Imported here so that headless entry points (batch.py) start without Gradio
+    import gradio as gr
+    jobs.resume()
+    agent_roles = registry.roles()
 
     with gr.Blocks() as demo:
         gr.Markdown("## CrewAI Research Tool")
         with gr.Tab("Research"):
             topic_input = gr.Textbox(label="Enter Topic", placeholder="Type here...")
             agent_dropdown = gr.CheckboxGroup(label="Select Agents", choices=agent_roles)
+            pipeline_checkbox = gr.Checkbox(label="Run as pipeline (pass each agent's output to its next agent)")
+            refresh_checkbox = gr.Checkbox(label="Force refresh (ignore cached reports and start over)")
             submit_button = gr.Button("Start Research")
+            stop_button = gr.Button("Stop")
+            with gr.Row():
+                job_id_input = gr.Textbox(label="Job ID", placeholder="Filled in when a run is submitted")
+                check_button = gr.Button("Check Job")
+            gr.Markdown(jobs.stats_markdown, every=5)
+            with gr.Accordion("Metrics (Prometheus format)", open=False):
+                gr.Code(metrics.render, every=10)
             output = gr.Markdown(label="Result")
             
-            submit_button.click(
-                fn=sync_process_research,
-                inputs=[topic_input, agent_dropdown],
+            research_event = submit_button.click(
+                fn=process_research,
+                inputs=[topic_input, agent_dropdown, pipeline_checkbox, refresh_checkbox],
+                outputs=[job_id_input, output]
+            )
+            check_event = check_button.click(
+                fn=check_job,
+                inputs=job_id_input,
                 outputs=output
             )
+            stop_button.click(fn=jobs.cancel, inputs=job_id_input, cancels=[research_event, check_event])
             
-            gr.Markdown("### Research\nEnter a topic, select one or more agents, and click 'Start Research' to initiate the research process. The selected agents will work sequentially on gathering information, analyzing data, and generating a comprehensive report on the given topic.")
+            gr.Markdown("### Research\nEnter a topic, select one or more agents, and click 'Start Research' to initiate the research process. The selected agents will work in parallel on gathering information, analyzing data, and generating a comprehensive report on the given topic. In pipeline mode, agents run in the order given by their next agent, each one receiving the output of the agents before it. Progress is shown as the agents work; click 'Stop' to cancel a run. Topics researched recently are answered from the report cache unless 'Force refresh' is ticked. Each run is queued as a background job: keep its Job ID to check on it with 'Check Job' after reloading the page.")
 
-    demo.launch()
+    # Handlers only follow jobs, so they need no concurrency limit of their own
+    demo.queue(default_concurrency_limit=None).launch()
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,24 @@
 import os
-import gradio as gr
 from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
 from langchain_community.tools import DuckDuckGoSearchRun, DuckDuckGoSearchResults
-from crewai_tools import tool, SeleniumScrapingTool, ScrapeWebsiteTool
+from crewai_tools import tool, SeleniumScrapingTool
 import asyncio
+import inspect
 from langchain_community.output_parsers.rail_parser import GuardrailsOutputParser
+from search_cache import search_cache
+from instrumentation import metrics, traced_tool
+from scraper import scraper
+from doc_store import doc_store
+from progress import RunProgress
+from jobs import JobQueue, follow_job
+from report_cache import config_key, report_cache
+from checkpoints import checkpoints
+from config_registry import get_llm, with_context
+from compaction import compact_context, estimate_tokens
 
 # Define the DuckDuckGoSearch tool using the decorator for tool registration
 @tool('DuckDuckGoSearch')
+@traced_tool('DuckDuckGoSearch')
 def search(search_query: str):
     """
     This function uses DuckDuckGoSearch tool to search for the given query.
@@ -17,12 +27,13 @@ def search(search_query: str):
     search_query (str): The query to search for.
     
     Returns:
-    The search results.
+    The search results, served from the shared search cache when available.
     """
-    return DuckDuckGoSearchRun().run(search_query)
+    return search_cache.get_or_fetch('DuckDuckGoSearch', search_query, lambda query: DuckDuckGoSearchRun().run(query))
 
 # Define the DuckDuckGoSearch tool
 @tool('DuckDuckGoResults')
+@traced_tool('DuckDuckGoResults')
 def search_results(search_query: str):
     """
     This function uses DuckDuckGoResults tool to get the search results.
@@ -31,17 +42,16 @@ def search_results(search_query: str):
     search_query (str): The query to get results for.
     
     Returns:
-    The search results.
+    The search results, served from the shared search cache when available.
     """
-    return DuckDuckGoSearchResults().run(search_query)
+    return search_cache.get_or_fetch('DuckDuckGoResults', search_query, lambda query: DuckDuckGoSearchResults().run(query))
 
 
 
 # Define the WebScrapper tool
 @tool('WebScrapper')
-
+@traced_tool('WebScrapper')
 def web_scrapper(url: str):
-
     """
     Scrape content from a specified URL using a web scraping tool.
     
@@ -49,29 +59,56 @@ def web_scrapper(url: str):
     url (str): The URL to scrape.
 
     Returns:
-    ScrapeWebsiteTool: An object containing the scraped data.
+    The text content of the page.
     """
-    return ScrapeWebsiteTool(website_url=url)
+    return scraper.scrape_to_text([url])
 
-def kickoff_crew(topic: str) -> dict:
-    try:
-        """Kickoff the research process for a given topic using CrewAI components."""
-        # Retrieve the API key from the environment variables
+# Define the BatchWebScrapper tool
+@tool('BatchWebScrapper')
+@traced_tool('BatchWebScrapper')
+def batch_web_scrapper(urls: str):
+    """
+    Scrape the content of several URLs at once. Prefer this over WebScrapper when there is more than one URL.
+    
+    Args:
+    urls (str): The URLs to scrape, separated by commas or new lines.
 
-        groq_api_key = #add your groq key
-        if not groq_api_key:
-            raise ValueError("API Key for Groq is not set in environment variables")
+    Returns:
+    The text content of every page, one section per URL.
+    """
+    return scraper.scrape_to_text(urls)
+
+# Define the LocalDocumentSearch tool
+@tool('LocalDocumentSearch')
+@traced_tool('LocalDocumentSearch')
+def local_search(search_query: str):
+    """
+    Search the pages scraped in earlier runs. Use it before searching or scraping the web.
     
-        # Initialize the Groq large language model
-        groq_llm_70b = ChatGroq(temperature=0, groq_api_key=groq_api_key, model_name="llama3-70b-8192")
-        groq_llm_8b = ChatGroq(temperature=0, groq_api_key=groq_api_key, model_name="llama3-8b-8192")
+    Args:
+    search_query (str): What to look for.
+
+    Returns:
+    The most relevant stored passages with the URL they were scraped from.
+    """
+    return doc_store.search_to_text(search_query)
+
+def kickoff_crew(topic: str, progress: RunProgress = None, run_id: str = None, resume: bool = True) -> dict:
+    try:
+        """Kickoff the research process for a given topic using CrewAI components."""
+        # A run that failed part way resumes from the draft of its research task
+        checkpoint = checkpoints.open(topic, CREW_CONFIG_HASH, run_id, resume)
+        # Get the shared Groq clients; the API key is read from GROQ_API_KEY
+        groq_llm_70b = get_llm('groq_llm_70b')
+        # Tool-selection turns go to llama3-8b, final answers to llama3-70b
+        groq_llm_routed = get_llm('groq_llm_routed')
     
         # Define Agents with Groq LLM
         researcher = Agent(
             role='Researcher',
             goal='Collect detailed information on {topic}',
-            tools=[search, search_results, web_scrapper],
-            llm=groq_llm_70b,  # Assigning the Groq LLM here
+            tools=[local_search, search, search_results, web_scrapper, batch_web_scrapper],
+            llm=groq_llm_routed,  # Assigning the Groq LLM here
             backstory=(
                 "As a diligent researcher, you explore the depths of the internet to "
                 "unearth crucial information and insights on the assigned topics. "
@@ -88,6 +125,7 @@ def kickoff_crew(topic: str) -> dict:
         editor = Agent(
             role='Editor',
             goal='Compile and refine the information into a comprehensive report on {topic}',
+            tools=[local_search],
             llm=groq_llm_70b,  # Assigning the Groq LLM here
             backstory=(
                 "With a keen eye for detail and a strong command of language, you transform "
@@ -105,9 +143,10 @@ def kickoff_crew(topic: str) -> dict:
         # Define Tasks
         research_task = Task(
             description=(
+                "Start with the LocalDocumentSearch tool to find pages on {topic} that were already scraped. "
                 "Use DuckDuckGoSearch tool to gather initial information about {topic}. "
                 "Next, employ DuckDuckGoResults tool to gather full details of the insights from search results, reading them carefully and preparing detailed summaries on {topic}. "
-                "Utilize the WebScrapper tool to extract additional information and insights from all links or URLs that appear significant regarding {topic} after analyzing the snippets of the search results. "
+                "Utilize the BatchWebScrapper tool to extract additional information and insights from all links or URLs that appear significant regarding {topic} after analyzing the snippets of the search results, passing all of them in a single call. "
                 "Compile your findings into an initial draft, ensuring to include all sources with their titles and links relevant to the topic. "
                 "Throughout this process, maintain a high standard of accuracy and ensure that no information is fabricated or misrepresented."
             ),
@@ -127,7 +166,7 @@ def kickoff_crew(topic: str) -> dict:
                 "Enhance the readability of the report by improving language clarity, adjusting sentence structure, and ensuring consistency in tone. "
                 "Include a dedicated section that lists all sources used in the research_task. "
                 "Each source used in the analysis should be presented as a bullet point in the format: title: link "
-                "Ensure that all sources you include in the final report exist by scrapping them if necessary. "
+                "Ensure that all sources you include in the final report exist by looking them up with the LocalDocumentSearch tool if necessary. "
                 "This section should be comprehensive, clearly formatted, and easy to navigate, providing full transparency on the references used."
             ),
             expected_output=(
@@ -135,28 +174,74 @@ def kickoff_crew(topic: str) -> dict:
                 "that accurately reflects the research findings. It should include an introduction, a detailed and extensive discussion section, a concise conclusion, "
                 "and a well-organized source list. The document should be free of grammatical errors and ready for publication or presentation."
             ),
-            agent=editor,
-            context=[research_task]
+            agent=editor
         )
     
-        # Forming the Crew
-        crew = Crew(
-            agents=[researcher, editor],
-            tasks=[research_task, edit_task]
-        )
+        # Research first, reporting each step when the run is streamed
+        draft = checkpoint.get('Research')
+        if draft is not None:
+            if progress:
+                progress.emit("**Research** restored from the checkpoint of an earlier attempt")
+        else:
+            callbacks = progress.crew_callbacks(['Research']) if progress else {}
+            research_crew = Crew(
+                agents=[researcher],
+                tasks=[research_task],
+                **callbacks
+            )
+            draft = str(research_crew.kickoff(inputs={'topic': topic}))
+            checkpoint.save('Research', draft)
     
-        # Kick-off the research process
-        result = crew.kickoff(inputs={'topic': topic})
+        # The Editor gets the most relevant passages of the draft and its source list, not the raw dump
+        context = compact_context(draft, topic)
+        if progress:
+            progress.emit(f"Research draft condensed from ~{estimate_tokens(draft)} to ~{estimate_tokens(context)} tokens")
+        edit_task.description = with_context(edit_task.description, context)
+    
+        callbacks = progress.crew_callbacks(['Edit']) if progress else {}
+        edit_crew = Crew(
+            agents=[editor],
+            tasks=[edit_task],
+            **callbacks
+        )
+        result = edit_crew.kickoff(inputs={'topic': topic})
+        checkpoint.clear()
         return result
     except Exception as e:
         return f"Error: {str(e)}"
 
-async def process_research(topic):
-    result = await asyncio.to_thread(kickoff_crew, topic)
+# The crew is defined in code, so its source is what identifies the configuration
+CREW_CONFIG_HASH = config_key(inspect.getsource(kickoff_crew))
+
+def kickoff_and_store(topic: str, resume: bool = True, progress: RunProgress = None):
+    result = kickoff_crew(topic, progress, resume=resume)
+    # Failed runs come back as "Error: ..." and are not cached
+    if not str(result).startswith("Error:"):
+        report_cache.store(topic, CREW_CONFIG_HASH, str(result))
     return result
 
+# Crew runs are executed by a background job queue with its own worker pool
+jobs = JobQueue('app', kickoff_and_store)
+
+async def process_research(topic, force_refresh=False):
+    cached = None if force_refresh else report_cache.lookup(topic, CREW_CONFIG_HASH)
+    if cached:
+        yield "", cached.markdown()
+        return
+    # A forced refresh also starts over instead of resuming from task checkpoints
+    job_id = jobs.submit(topic, not force_refresh)
+    async for update in follow_job(jobs, job_id):
+        yield job_id, update
+
+async def check_job(job_id):
+    async for update in follow_job(jobs, job_id):
+        yield update
+
 async def main():
     """Set up the Gradio interface for the CrewAI Research Tool."""
+    # Imported here so that headless entry points (batch.py) start without Gradio
+    import gradio as gr
+    jobs.resume()
     with gr.Blocks() as demo:
         gr.Markdown("## CrewAI Research Tool")
         
@@ -167,29 +252,44 @@ async def main():
                 col_count=(7, "fixed"),
                 row_count=(2, "fixed"),
                 value=[
-                    ["Researcher", "Collect detailed information on {topic}", "DuckDuckGoSearch, DuckDuckGoResults, WebScrapper", "groq_llm_70b", "As a diligent researcher, you explore the depths of the internet to unearth crucial information and insights on the assigned topics. With a keen eye for detail and a commitment to accuracy, you meticulously document every source and piece of data gathered. Your research is thorough, ensuring that no stone is left unturned. This dedication not only enhances the quality of the information but also ensures reliability and trustworthiness in your findings.", False, 5],
-                    ["Editor", "Compile and refine the information into a comprehensive report on {topic}", "", "groq_llm_70b", "With a keen eye for detail and a strong command of language, you transform raw data into polished, insightful reports that are both informative and engaging. Your expertise in editing ensures that every report is not only thorough but also clearly communicates the key findings in a manner that is accessible to all readers. As an editor, your role is crucial in shaping the final presentation of data, making complex information easy to understand and appealing to the audience.", False, 3]
+                    ["Researcher", "Collect detailed information on {topic}", "LocalDocumentSearch, DuckDuckGoSearch, DuckDuckGoResults, WebScrapper, BatchWebScrapper", "groq_llm_routed", "As a diligent researcher, you explore the depths of the internet to unearth crucial information and insights on the assigned topics. With a keen eye for detail and a commitment to accuracy, you meticulously document every source and piece of data gathered. Your research is thorough, ensuring that no stone is left unturned. This dedication not only enhances the quality of the information but also ensures reliability and trustworthiness in your findings.", False, 5],
+                    ["Editor", "Compile and refine the information into a comprehensive report on {topic}", "LocalDocumentSearch", "groq_llm_70b", "With a keen eye for detail and a strong command of language, you transform raw data into polished, insightful reports that are both informative and engaging. Your expertise in editing ensures that every report is not only thorough but also clearly communicates the key findings in a manner that is accessible to all readers. As an editor, your role is crucial in shaping the final presentation of data, making complex information easy to understand and appealing to the audience.", False, 3]
                 ]
             )
             gr.Markdown("### Agents\nHere you can define the agents that will be part of the research crew. Each agent has a specific role, goal, tools, LLM, backstory, and other settings. You can edit these details to customize the agents according to your needs.")
-            gr.Markdown("#### Examples\n- Role: Researcher, Analyst, Editor, Fact-Checker\n- Goal: Collect information, Analyze data, Refine report, Verify facts\n- Tools: DuckDuckGoSearch, DuckDuckGoResults, WebScrapper\n- LLM: groq_llm_70b, groq_llm_8b\n- Backstory: Provide a brief description of the agent's background and expertise.")
+            gr.Markdown("#### Examples\n- Role: Researcher, Analyst, Editor, Fact-Checker\n- Goal: Collect information, Analyze data, Refine report, Verify facts\n- Tools: LocalDocumentSearch, DuckDuckGoSearch, DuckDuckGoResults, WebScrapper, BatchWebScrapper\n- LLM: groq_llm_70b, groq_llm_8b, groq_llm_routed (tool turns on llama3-8b, answers on llama3-70b), groq_llm_routed_summary (answers on llama3-8b too, escalated when empty)\n- Backstory: Provide a brief description of the agent's background and expertise.")
         
         with gr.Tab("Research"):
             topic_input = gr.Textbox(label="Enter Topic", placeholder="Type here...")
+            refresh_checkbox = gr.Checkbox(label="Force refresh (ignore cached reports and start over)")
             submit_button = gr.Button("Start Research")
+            stop_button = gr.Button("Stop")
+            with gr.Row():
+                job_id_input = gr.Textbox(label="Job ID", placeholder="Filled in when a run is submitted")
+                check_button = gr.Button("Check Job")
+            gr.Markdown(jobs.stats_markdown, every=5)
+            with gr.Accordion("Metrics (Prometheus format)", open=False):
+                gr.Code(metrics.render, every=10)
             output = gr.Markdown(label="Result")
             
-            submit_button.click(
+            research_event = submit_button.click(
                 fn=process_research,
-                inputs=topic_input,
+                inputs=[topic_input, refresh_checkbox],
+                outputs=[job_id_input, output]
+            )
+            check_event = check_button.click(
+                fn=check_job,
+                inputs=job_id_input,
                 outputs=output
             )
+            stop_button.click(fn=jobs.cancel, inputs=job_id_input, cancels=[research_event, check_event])
             
-            gr.Markdown("### Research\nEnter a topic and click 'Start Research' to initiate the research process. The crew of agents will work together to gather information, analyze data, and generate a comprehensive report on the given topic.")
+            gr.Markdown("### Research\nEnter a topic and click 'Start Research' to initiate the research process. The crew of agents will work together to gather information, analyze data, and generate a comprehensive report on the given topic. Progress is shown as the agents work; click 'Stop' to cancel a run. Topics researched recently are answered from the report cache unless 'Force refresh' is ticked. Each run is queued as a background job: keep its Job ID to check on it with 'Check Job' after reloading the page.")
             gr.Markdown("#### Example Topics\n- Artificial Intelligence\n- Climate Change\n- Blockchain Technology\n- Renewable Energy\n- Cybersecurity")
 
     # demo.launch(debug=True)
-    demo.queue(api_open=False, max_size=3).launch()
+    # Handlers only follow jobs, so they need no concurrency limit of their own
+    demo.queue(api_open=False, default_concurrency_limit=None).launch()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,202 @@
+"""
+Headless batch runner: produce one report per topic listed in a CSV or JSONL file.
+
+Usage:
+    python batch.py TOPICS_FILE --out DIR [--workers N] [--rpm N] [--tpm N] [--force]
+
+CSV files need a `topic` column and may have `agents` (roles separated by
+`;` or `|`) and `pipeline` (true/false) columns. JSONL lines are objects
+with the same keys; `agents` may also be a list. Topics without agents run
+the Researcher/Editor crew of app.py; topics with agents run those roles
+through Appv3.
+
+Reports are written to DIR as they finish, and every finished topic is
+appended to DIR/manifest.jsonl. Running the same command again skips the
+topics the manifest lists as done, so an interrupted batch resumes where it
+stopped. A topic that failed part way is run again from the checkpoints of
+the tasks it finished; --force starts every topic over.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Topics processed at the same time
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+MANIFEST = 'manifest.jsonl'
+
+
+def parse_agents(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r'[;|]', value)
+    return [role.strip() for role in value if role and role.strip()]
+
+
+def parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def read_items(path: str) -> list:
+    """
+    Read the topics of a batch.
+
+    Returns:
+    list: Dicts with `key`, `topic`, `agents` and `pipeline`, in file order.
+    """
+    from report_cache import config_key
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            rows = [json.loads(line) for line in file if line.strip()]
+        else:
+            rows = list(csv.DictReader(file))
+    items = []
+    for number, row in enumerate(rows, 1):
+        topic = (row.get('topic') or '').strip()
+        if not topic:
+            raise ValueError(f"{path}: entry {number} has no topic")
+        agents = parse_agents(row.get('agents'))
+        pipeline = parse_bool(row.get('pipeline'))
+        # The key identifies the work, so reordering the file does not redo finished topics
+        items.append({'key': config_key(topic, pipeline, *agents)[:12], 'topic': topic, 'agents': agents, 'pipeline': pipeline})
+    return items
+
+
+def read_manifest(out_dir: str) -> dict:
+    """The latest manifest entry of every item key."""
+    entries = {}
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be cut off when the process was killed mid-write
+                    continue
+                entries[entry['key']] = entry
+    return entries
+
+
+def report_filename(item: dict) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '-', item['topic'].lower()).strip('-')[:60] or 'report'
+    return f"{slug}-{item['key']}.md"
+
+
+def run_item(item: dict, force: bool = False) -> tuple:
+    """
+    Produce the report of one item, answering it from the report cache when possible.
+
+    Returns:
+    tuple: The report text and an error message (None on success).
+    """
+    from report_cache import report_cache
+    if not item['agents']:
+        import app
+        cached = None if force else report_cache.lookup(item['topic'], app.CREW_CONFIG_HASH)
+        if cached:
+            return cached.report, None
+        # Forced items also start over instead of resuming from task checkpoints
+        result = str(app.kickoff_and_store(item['topic'], resume=not force))
+        return result, result if result.startswith("Error:") else None
+    import Appv3
+    config_hash = Appv3.report_config_hash(item['agents'], item['pipeline'])
+    cached = None if force else report_cache.lookup(item['topic'], config_hash)
+    if cached:
+        return cached.report, None
+    results = Appv3.kickoff_crew(item['topic'], item['agents'], item['pipeline'], resume=not force)
+    report = "\n".join(results)
+    errors = [result for result in results if result.startswith("Error:")]
+    # Reports with a failed role are not cached
+    if not errors:
+        report_cache.store(item['topic'], config_hash, report)
+    return report, "; ".join(errors) or None
+
+
+def run_batch(items: list, out_dir: str, workers: int = BATCH_WORKERS, force: bool = False) -> dict:
+    """
+    Run every item that the manifest does not list as done.
+
+    Args:
+    items (list): Items from read_items.
+    out_dir (str): Directory receiving the reports and the manifest.
+    workers (int): Items processed at the same time.
+    force (bool): Ignore the report cache and task checkpoints.
+
+    Returns:
+    dict: Counts of done, failed and skipped items.
+    """
+    from instrumentation import trace_run
+    from rate_limit import BATCH, priority
+    os.makedirs(out_dir, exist_ok=True)
+    finished = read_manifest(out_dir)
+    pending = [item for item in items if finished.get(item['key'], {}).get('status') != 'done']
+    counts = {'done': 0, 'failed': 0, 'skipped': len(items) - len(pending)}
+    lock = threading.Lock()
+    manifest = open(os.path.join(out_dir, MANIFEST), 'a', encoding='utf-8')
+
+    def work(item):
+        start = time.perf_counter()
+        # Interactive runs of the web UI in the same process go first at the rate limiter
+        with trace_run('batch', run_id=item['key']), priority(BATCH):
+            try:
+                report, error = run_item(item, force)
+            except Exception as e:
+                report, error = None, f"Error: {e}"
+        entry = {'key': item['key'], 'topic': item['topic'], 'agents': item['agents'], 'pipeline': item['pipeline'],
+                 'status': 'failed' if error else 'done', 'error': error, 'seconds': round(time.perf_counter() - start, 1),
+                 'finished_at': time.time()}
+        if not error:
+            # Written to a temporary file first so a report is either complete or missing
+            entry['file'] = report_filename(item)
+            path = os.path.join(out_dir, entry['file'])
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+                file.write(f"# {item['topic']}\n\n{report}\n")
+            os.replace(f"{path}.tmp", path)
+        with lock:
+            manifest.write(json.dumps(entry) + '\n')
+            manifest.flush()
+            counts[entry['status']] += 1
+            total = counts['done'] + counts['failed']
+        print(f"[{total}/{len(pending)}] {entry['status']:<6} {item['topic']} ({entry['seconds']} s)"
+              + (f": {error[:200]}" if error else ''), flush=True)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(work, item) for item in pending]
+            for future in as_completed(futures):
+                future.result()
+    finally:
+        manifest.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('topics', help="CSV or JSONL file of topics")
+    parser.add_argument('--out', required=True, help="Output directory for reports and the manifest")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    parser.add_argument('--rpm', type=float, default=None, help="Groq requests per minute per model (default: the model's limit or GROQ_RPM)")
+    parser.add_argument('--tpm', type=float, default=None, help="Groq tokens per minute per model (default: the model's limit or GROQ_TPM)")
+    parser.add_argument('--force', action='store_true', help="Ignore cached reports and task checkpoints")
+    args = parser.parse_args()
+
+    items = read_items(args.topics)
+    if args.rpm is not None or args.tpm is not None:
+        from rate_limit import groq_rate_limiter
+        groq_rate_limiter.set_limits(rpm=args.rpm, tpm=args.tpm)
+    counts = run_batch(items, args.out, args.workers, args.force)
+    print(f"{counts['done']} done, {counts['failed']} failed, {counts['skipped']} already done")
+    raise SystemExit(1 if counts['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
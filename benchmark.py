@@ -0,0 +1,342 @@
+"""
+Benchmarks for the report creator.
+
+Usage:
+    python benchmark.py setup [--iterations N] [--role ROLE]
+    python benchmark.py scrape [--pages N] [--delay SECONDS]
+    python benchmark.py crew [--target app|appv2|appv3] [--topics N] [--concurrency N]
+                             [--llm-latency SECONDS] [--tokens N] [--tool-latency SECONDS]
+
+The crew benchmark runs entirely offline: the Groq clients are replaced by a
+deterministic fake chat model and the search and scrape backends by fakes.
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The benchmarks never call Groq, but ChatGroq refuses to build without a key
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+# The fake model has no rate limits to respect
+os.environ.setdefault('GROQ_RPM', '0')
+os.environ.setdefault('GROQ_TPM', '0')
+# Keep CrewAI's telemetry exporter off the network
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+
+from crewai import Agent, Task
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_groq import ChatGroq
+from config_registry import AgentRegistry, set_llm_factory
+from search_cache import SearchCache
+from doc_store import DocStore
+from checkpoints import CheckpointStore
+
+CONFIG_FILE = 'agents_and_tasks.json'
+
+
+def legacy_setup(file_path: str, role: str, tools: dict):
+    """Per-request setup as it was done before the registry: parse and build every agent."""
+    with open(file_path, 'r') as file:
+        data = json.load(file)
+    agents = []
+    tasks = []
+    for agent_data in data['agents']:
+        agent = Agent(
+            role=agent_data['role'],
+            goal=agent_data['goal'],
+            tools=[tools[tool_name] for tool_name in agent_data['tools']],
+            llm=ChatGroq(temperature=0, groq_api_key=os.environ['GROQ_API_KEY'], model_name="llama3-70b-8192"),
+            backstory=agent_data['backstory'],
+            allow_delegation=agent_data['allow_delegation'],
+            max_iter=agent_data['max_iter'],
+            verbose=agent_data['verbose'],
+        )
+        for task_data in agent_data['tasks']:
+            tasks.append(Task(
+                description=task_data['description'],
+                expected_output=task_data['expected_output'],
+                agent=agent
+            ))
+        agents.append(agent)
+    selected_agent = [agent for agent in agents if agent.role == role][0]
+    selected_tasks = [task for task in tasks if task.agent.role == role]
+    return [selected_agent], selected_tasks
+
+
+def _time_calls(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _percentile(timings: list, fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _summary(name: str, timings: list) -> str:
+    p95 = _percentile(timings, 0.95)
+    return f"{name:<10} mean {statistics.mean(timings) * 1000:8.2f} ms   p50 {statistics.median(timings) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms"
+
+
+def bench_setup(iterations: int, role: str):
+    """Compare per-request setup time of the legacy loader and the shared registry."""
+    import Appv2
+    # The same name lookup the apps give their registry, so every tool in the config resolves
+    tools = vars(Appv2)
+
+    registry = AgentRegistry(CONFIG_FILE, tools)
+    registry.build([role])  # first request pays for parsing and the LLM client
+
+    before = _time_calls(lambda: legacy_setup(CONFIG_FILE, role, tools), iterations)
+    after = _time_calls(lambda: registry.build([role]), iterations)
+    print(f"Per-request setup for role '{role}' over {iterations} requests")
+    print(_summary('before', before))
+    print(_summary('after', after))
+    print(f"speedup    {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+class _SlowPageHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = f"<html><body><h1>{self.path}</h1><p>{'Lorem ipsum dolor sit amet. ' * 200}</p></body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_scrape(pages: int, delay: float):
+    """Compare one-URL-at-a-time scraping with the batch scraper against a local server."""
+    import requests
+    from scraper import BatchScraper, extract_text
+
+    _SlowPageHandler.delay = delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SlowPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    # Agents tend to repeat links, e.g. with tracking parameters or fragments
+    urls = [f"{base}/page/{index}" for index in range(pages)]
+    urls += [f"{url}?utm_source=search#section" for url in urls[:pages // 2]]
+
+    try:
+        start = time.perf_counter()
+        for url in urls:
+            extract_text(requests.get(url, timeout=15).content)
+        serial = time.perf_counter() - start
+
+        scraper = BatchScraper(max_per_host=8)
+        start = time.perf_counter()
+        results = scraper.scrape(urls)
+        batch = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    print(f"Scraping {len(urls)} URLs ({pages} unique) with {delay * 1000:.0f} ms server latency")
+    print(f"serial     {serial:8.2f} s   {len(urls) / serial:8.1f} pages/s")
+    print(f"batch      {batch:8.2f} s   {len(results) / batch:8.1f} pages/s   ({len(results)} fetched)")
+    print(f"speedup    {serial / batch:.1f}x")
+
+
+# Words the fake model and fake tools build their output from
+_LOREM = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+          "incididunt ut labore et dolore magna aliqua").split()
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatGroq.
+
+    Every request sleeps `latency` seconds. The model calls the agent's tools
+    in the order they are offered, `tool_calls` times in total, and then gives
+    a final answer of `completion_tokens` words.
+    """
+
+    model_name: str = 'fake'
+    latency: float = 0.0
+    completion_tokens: int = 200
+    tool_calls: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'model_name': self.model_name}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = '\n'.join(str(message.content) for message in messages)
+        time.sleep(self.latency)
+        offered = re.search(r"only one name of \[(.*?)\]", prompt)
+        tool_names = [name.strip() for name in offered.group(1).split(',') if name.strip()] if offered else []
+        # Every tool call made so far is part of the agent scratchpad in the prompt
+        used = prompt.count('Action Input: {')
+        if tool_names and used < self.tool_calls:
+            tool_name = tool_names[used % len(tool_names)]
+            text = f"Thought: I should use {tool_name}\nAction: {tool_name}\nAction Input: {json.dumps(_fake_tool_input(tool_name, prompt))}"
+        else:
+            words = ' '.join(_LOREM[index % len(_LOREM)] for index in range(self.completion_tokens))
+            text = f"Thought: I now know the final answer\nFinal Answer: {words}"
+        usage = {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(text.split())}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        message = AIMessage(content=text, response_metadata={'token_usage': usage, 'model_name': self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={'token_usage': usage, 'model_name': self.model_name})
+
+
+def _fake_tool_input(tool_name: str, prompt: str) -> dict:
+    task = re.search(r"Current Task: (.*)", prompt)
+    query = (task.group(1) if task else 'benchmark')[:60]
+    slug = re.sub(r'[^a-z0-9]+', '-', query.lower()).strip('-')
+    if tool_name == 'WebScrapper':
+        return {'url': f"https://bench.example/{slug}/0"}
+    if tool_name == 'BatchWebScrapper':
+        return {'urls': ', '.join(f"https://bench.example/{slug}/{index}" for index in range(3))}
+    return {'search_query': query}
+
+
+class FakeSearch:
+    """Stands in for DuckDuckGoSearchRun and DuckDuckGoSearchResults."""
+
+    latency = 0.0
+
+    def run(self, query: str) -> str:
+        time.sleep(self.latency)
+        slug = re.sub(r'[^a-z0-9]+', '-', query.lower()).strip('-')
+        return '\n'.join(f"[snippet: {' '.join(_LOREM)}, title: {query} result {index}, link: https://bench.example/{slug}/{index}]"
+                         for index in range(5))
+
+
+class FakeScraper:
+    """Stands in for the shared BatchScraper; fetches the URLs of a batch in parallel."""
+
+    def __init__(self, latency: float = 0.0, chars: int = 2000):
+        self.latency = latency
+        self.chars = chars
+
+    def scrape_to_text(self, urls) -> str:
+        from scraper import parse_urls
+        urls = parse_urls(urls) if isinstance(urls, str) else list(urls)
+        time.sleep(self.latency)
+        page = (' '.join(_LOREM) + ' ') * (self.chars // 100 + 1)
+        return '\n\n'.join(f"## {url}\n{page[:self.chars]}" for url in urls)
+
+
+TOPICS = [
+    "Renewable energy storage", "Quantum computing in finance", "Microplastics in oceans",
+    "Large language model evaluation", "Urban vertical farming", "CRISPR gene therapy trials",
+    "Low earth orbit satellite internet", "Solid state batteries",
+]
+
+
+def _crew_target(target: str, roles: list, pipeline: bool, tool_latency: float):
+    """Import an entry point, swap its search and scrape backends for fakes and return its kickoff."""
+    if target == 'app':
+        import app as module
+        kickoff = module.kickoff_crew
+    elif target == 'appv2':
+        import Appv2 as module
+        kickoff = lambda topic: module.kickoff_crew(topic, roles[0])
+    else:
+        import Appv3 as module
+        kickoff = lambda topic: module.kickoff_crew(topic, roles, pipeline)
+    FakeSearch.latency = tool_latency
+    module.DuckDuckGoSearchRun = FakeSearch
+    module.DuckDuckGoSearchResults = FakeSearch
+    module.scraper = FakeScraper(tool_latency)
+    # Fresh in-memory caches, so no run is answered from an earlier benchmark
+    module.search_cache = SearchCache(path=None)
+    module.doc_store = DocStore(path=':memory:')
+    if hasattr(module, 'checkpoints'):
+        module.checkpoints = CheckpointStore(path=':memory:')
+    return kickoff
+
+
+def _failed(result) -> bool:
+    results = result if isinstance(result, list) else [result]
+    return any(str(item).startswith("Error:") for item in results)
+
+
+def bench_crew(target: str, topics: int, concurrency: int, llm_latency: float, tokens: int,
+               tool_calls: int, tool_latency: float, roles: list, pipeline: bool):
+    """Drive an entry point's kickoff_crew over a topic workload against fake LLM and tools."""
+    set_llm_factory(lambda model_name: FakeChatModel(model_name=model_name, latency=llm_latency,
+                                                     completion_tokens=tokens, tool_calls=tool_calls))
+    kickoff = _crew_target(target, roles, pipeline, tool_latency)
+    workload = [f"{TOPICS[index % len(TOPICS)]} {index // len(TOPICS) + 1}" for index in range(topics)]
+
+    def timed(topic):
+        start = time.perf_counter()
+        result = kickoff(topic)
+        return time.perf_counter() - start, _failed(result)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    # The agents are verbose; their console output is not part of the measurement
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(timed, workload))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = [duration for duration, _ in outcomes]
+    failures = sum(1 for _, failed in outcomes if failed)
+    print(f"Crew benchmark '{target}': {topics} topics, concurrency {concurrency}, "
+          f"LLM latency {llm_latency * 1000:.0f} ms, tool latency {tool_latency * 1000:.0f} ms")
+    print(f"throughput {topics / elapsed:8.2f} runs/s   ({elapsed:.2f} s total, {failures} failed)")
+    print(f"latency    p50 {statistics.median(timings):8.2f} s   p95 {_percentile(timings, 0.95):8.2f} s")
+    print(f"memory     peak {peak / 1024 / 1024:8.1f} MiB traced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    setup_parser = subparsers.add_parser('setup', help="Per-request agent/task setup time")
+    setup_parser.add_argument('--iterations', type=int, default=20)
+    setup_parser.add_argument('--role', default='Researcher')
+    scrape_parser = subparsers.add_parser('scrape', help="Serial vs batch scraping against a local HTTP server")
+    scrape_parser.add_argument('--pages', type=int, default=32)
+    scrape_parser.add_argument('--delay', type=float, default=0.1)
+    crew_parser = subparsers.add_parser('crew', help="kickoff_crew throughput and latency with a fake LLM and fake tools")
+    crew_parser.add_argument('--target', choices=['app', 'appv2', 'appv3'], default='app')
+    crew_parser.add_argument('--topics', type=int, default=8)
+    crew_parser.add_argument('--concurrency', type=int, default=1)
+    crew_parser.add_argument('--llm-latency', type=float, default=0.2)
+    crew_parser.add_argument('--tokens', type=int, default=300, help="Words in every final answer")
+    crew_parser.add_argument('--tool-calls', type=int, default=2, help="Tool calls per task before the final answer")
+    crew_parser.add_argument('--tool-latency', type=float, default=0.1)
+    crew_parser.add_argument('--roles', nargs='+', default=None, help="Roles for appv2 (first one) and appv3")
+    crew_parser.add_argument('--pipeline', action='store_true', help="Run the appv3 roles as a dependency pipeline")
+    args = parser.parse_args()
+
+    if args.command == 'setup':
+        bench_setup(args.iterations, args.role)
+    elif args.command == 'scrape':
+        bench_scrape(args.pages, args.delay)
+    elif args.command == 'crew':
+        roles = args.roles or (['Researcher'] if args.target == 'appv2' else ['Researcher', 'Editor', 'Content Writer'])
+        bench_crew(args.target, args.topics, args.concurrency, args.llm_latency, args.tokens,
+                   args.tool_calls, args.tool_latency, roles, args.pipeline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from instrumentation import metrics
+from report_cache import config_key
+from search_cache import normalize_query
+
+# Seconds the task outputs of an unfinished run can be resumed from
+CHECKPOINT_MAX_AGE = float(os.environ.get('CHECKPOINT_MAX_AGE', str(24 * 60 * 60)))
+# SQLite file holding the outputs of finished tasks
+CHECKPOINT_PATH = os.environ.get('CHECKPOINT_PATH', os.path.join('.cache', 'checkpoints.sqlite3'))
+
+metrics.describe('report_checkpoint_tasks_total', "Task outputs saved to or restored from the checkpoint store.")
+
+
+def run_key(topic: str, config_hash: str) -> str:
+    """Default run ID: the same topic and configuration resume the same run."""
+    return config_key(normalize_query(topic), config_hash)[:16]
+
+
+def task_output(task):
+    """The raw output of a CrewAI task that finished, else None."""
+    output = getattr(task, 'output', None)
+    return getattr(output, 'raw_output', None) if output is not None else None
+
+
+class RunCheckpoints:
+    """The task outputs of one run, bound to its run ID, topic and configuration hash."""
+
+    def __init__(self, store, run_id: str, topic: str, config_hash: str):
+        self.store = store
+        self.run_id = run_id
+        self.topic = topic
+        self.config_hash = config_hash
+        self.completed = store.load(run_id, config_hash)
+
+    def get(self, task_key: str):
+        """The stored output of a task finished by an earlier attempt, or None."""
+        output = self.completed.get(task_key)
+        if output is not None:
+            metrics.inc('report_checkpoint_tasks_total', outcome='restored')
+        return output
+
+    def save(self, task_key: str, output: str):
+        self.store.save(self.run_id, task_key, self.topic, self.config_hash, output)
+        self.completed[task_key] = output
+        metrics.inc('report_checkpoint_tasks_total', outcome='saved')
+
+    def save_tasks(self, keyed_tasks: dict):
+        """Save every task of a crew that finished, e.g. after the crew raised half way."""
+        for task_key, task in keyed_tasks.items():
+            output = task_output(task)
+            if output is not None:
+                self.save(task_key, output)
+
+    def clear(self):
+        """Forget the run once it has finished."""
+        self.store.clear(self.run_id)
+        self.completed = {}
+
+
+class CheckpointStore:
+    """
+    Outputs of finished tasks keyed on run ID and task, so a failed run can resume.
+
+    Every output is stored with the run's topic and configuration hash;
+    outputs stored under another configuration or older than `max_age` are
+    never resumed from. Runs clear their checkpoints once they succeed.
+    """
+
+    def __init__(self, path: str, max_age: float = CHECKPOINT_MAX_AGE, clock=time.time):
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT NOT NULL, task_key TEXT NOT NULL, topic TEXT NOT NULL, config_hash TEXT NOT NULL, "
+            "output TEXT NOT NULL, stored_at REAL NOT NULL, PRIMARY KEY (run_id, task_key))"
+        )
+        self._db.commit()
+
+    def open(self, topic: str, config_hash: str, run_id: str = None, resume: bool = True) -> RunCheckpoints:
+        """
+        Start or resume a run.
+
+        Args:
+        topic (str): The research topic of the run.
+        config_hash (str): Hash of the crew configuration the run uses.
+        run_id (str): Explicit run ID; defaults to one derived from the topic and configuration.
+        resume (bool): Resume from earlier task outputs; False discards them.
+
+        Returns:
+        RunCheckpoints: The run's checkpoints.
+        """
+        run_id = run_id or run_key(topic, config_hash)
+        if not resume:
+            self.clear(run_id)
+        return RunCheckpoints(self, run_id, topic, config_hash)
+
+    def load(self, run_id: str, config_hash: str) -> dict:
+        """Fresh task outputs of a run that were stored under the given configuration."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT task_key, output FROM checkpoints WHERE run_id = ? AND config_hash = ? AND stored_at >= ?",
+                (run_id, config_hash, self.clock() - self.max_age)
+            ).fetchall()
+        return dict(rows)
+
+    def save(self, run_id: str, task_key: str, topic: str, config_hash: str, output: str):
+        now = self.clock()
+        with self._lock:
+            # Runs that never finished are dropped once they can no longer be resumed
+            self._db.execute("DELETE FROM checkpoints WHERE stored_at < ?", (now - self.max_age,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, task_key, topic, config_hash, output, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, task_key, topic.strip(), config_hash, output, now)
+            )
+            self._db.commit()
+
+    def clear(self, run_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._db.commit()
+
+
+# Checkpoint store shared by the entry points
+checkpoints = CheckpointStore(CHECKPOINT_PATH)
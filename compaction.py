@@ -0,0 +1,181 @@
+import math
+import os
+import re
+import time
+from urllib.parse import urlsplit
+from instrumentation import record
+from urls import canonical_url
+
+# Approximate number of tokens of upstream output handed to the next task
+COMPACT_TOKEN_BUDGET = int(os.environ.get('COMPACT_TOKEN_BUDGET', '1500'))
+# Approximate size of one ranked chunk, in tokens
+COMPACT_CHUNK_TOKENS = int(os.environ.get('COMPACT_CHUNK_TOKENS', '120'))
+# Smallest share of the budget kept for passages when the list of cited sources is long
+COMPACT_MIN_NOTES_SHARE = float(os.environ.get('COMPACT_MIN_NOTES_SHARE', '0.5'))
+# Word-shingle overlap above which two chunks count as the same passage
+COMPACT_DUPLICATE_SIMILARITY = 0.8
+
+_URL = re.compile(r"https?://[^\s<>\"'\)\]\},]+")
+_MARKDOWN_LINK = re.compile(r"\[([^\]]+)\]\((https?://[^\s)]+)\)")
+_TITLE_LINK = re.compile(r"title:\s*(.+?),\s*link:\s*(https?://[^\s\]\},]+)", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = set("a an and are as at be by for from in into is it of on or the this that to with about how what why".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _words(text: str) -> list:
+    return _WORD.findall(text.casefold())
+
+
+def extract_sources(text: str) -> list:
+    """
+    Collect the cited sources of a text, deduplicated by canonical URL.
+
+    Titles are taken from markdown links, DuckDuckGo "title: ..., link: ..."
+    results or "title: link" lines; other URLs are listed under their host.
+
+    Returns:
+    list: (title, url) tuples in order of first appearance.
+    """
+    titles = {}
+    for pattern in (_MARKDOWN_LINK, _TITLE_LINK):
+        for title, url in pattern.findall(text):
+            titles.setdefault(canonical_url(url.rstrip('.;')), title.strip(' -*#:'))
+    sources = []
+    seen = set()
+    for line in text.splitlines():
+        for url in _URL.findall(line):
+            url = url.rstrip('.;')
+            key = canonical_url(url)
+            if key in seen:
+                continue
+            seen.add(key)
+            title = titles.get(key)
+            if not title:
+                prefix = line[:line.find(url)].strip(' -*#:([')
+                title = prefix if 0 < len(prefix) <= 120 and not _URL.search(prefix) else urlsplit(url).hostname
+            sources.append((title, url))
+    return sources
+
+
+def split_chunks(text: str, chunk_tokens: int = COMPACT_CHUNK_TOKENS) -> list:
+    """Split text into paragraph-aligned chunks of roughly `chunk_tokens` tokens."""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= chunk_tokens:
+            chunks.append(paragraph)
+            continue
+        current = ''
+        sentences = []
+        for sentence in re.split(r"(?<=[.!?])\s+|\n", paragraph):
+            # Text without sentence breaks (e.g. scraped pages) is cut into word windows
+            if estimate_tokens(sentence) <= chunk_tokens:
+                sentences.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, chunk_tokens * 3 // 4)
+            sentences += [' '.join(words[index:index + step]) for index in range(0, len(words), step)]
+        for sentence in sentences:
+            if current and estimate_tokens(current) + estimate_tokens(sentence) > chunk_tokens:
+                chunks.append(current)
+                current = ''
+            current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _shingles(words: list) -> set:
+    return {' '.join(words[index:index + 3]) for index in range(max(1, len(words) - 2))}
+
+
+def dedupe_chunks(chunks: list) -> list:
+    """Drop chunks that repeat an earlier chunk word for word or nearly so."""
+    kept = []
+    kept_shingles = []
+    for chunk in chunks:
+        shingles = _shingles(_words(chunk))
+        if any(len(shingles & other) / len(shingles | other) >= COMPACT_DUPLICATE_SIMILARITY for other in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def rank_chunks(chunks: list, topic: str) -> list:
+    """
+    Score every chunk against the topic with TF-IDF over the chunks.
+
+    Chunks citing a URL or containing figures get a small bonus, since the
+    editor has to keep facts and citations.
+
+    Returns:
+    list: One score per chunk.
+    """
+    chunk_words = [_words(chunk) for chunk in chunks]
+    terms = [term for term in _words(topic) if term not in _STOPWORDS] or _words(topic)
+    scores = []
+    for chunk, words in zip(chunks, chunk_words):
+        score = 0.0
+        for term in set(terms):
+            frequency = words.count(term)
+            if frequency:
+                containing = sum(1 for other in chunk_words if term in other)
+                score += (1 + math.log(frequency)) * math.log(1 + len(chunks) / containing)
+        score /= math.sqrt(len(words) or 1)
+        score += 0.1 * bool(_URL.search(chunk)) + 0.05 * bool(re.search(r"\d", chunk))
+        scores.append(score)
+    return scores
+
+
+def compact_context(text: str, topic: str, budget: int = COMPACT_TOKEN_BUDGET) -> str:
+    """
+    Condense upstream output to fit a token budget before it is passed on.
+
+    The text is chunked, repeated passages are dropped and the chunks most
+    relevant to the topic are kept in their original order, followed by the
+    list of every source the full text cited. The source list is never
+    shortened: its tokens are taken from the chunks' share of the budget,
+    down to COMPACT_MIN_NOTES_SHARE of it, so a very long source list can
+    push the result past the budget. Text already within the budget is
+    returned unchanged.
+
+    Args:
+    text (str): The upstream task output.
+    topic (str): The research topic the chunks are ranked against.
+    budget (int): Approximate token budget for the kept chunks.
+
+    Returns:
+    str: The condensed context.
+    """
+    if not text or estimate_tokens(text) <= budget:
+        return text
+    start = time.perf_counter()
+    header = "Condensed notes (the most relevant passages of the upstream output):\n\n"
+    sources_header = "\n\nSources cited upstream:\n"
+    sources = '\n'.join(f"- {title}: {url}" for title, url in extract_sources(text))
+    # The headings, the source list and the blank lines between chunks all count against the budget
+    remaining = budget - estimate_tokens(header) - (estimate_tokens(sources_header + sources) if sources else 0)
+    remaining = max(remaining, int(budget * COMPACT_MIN_NOTES_SHARE))
+    chunks = dedupe_chunks(split_chunks(text))
+    scores = rank_chunks(chunks, topic)
+    selected = set()
+    used = 0
+    for index in sorted(range(len(chunks)), key=lambda index: scores[index], reverse=True):
+        tokens = estimate_tokens(chunks[index]) + 1
+        if used + tokens <= remaining:
+            selected.add(index)
+            used += tokens
+    notes = '\n\n'.join(chunk for index, chunk in enumerate(chunks) if index in selected)
+    compacted = f"{header}{notes}"
+    if sources:
+        compacted += f"{sources_header}{sources}"
+    record('compact', 'context', time.perf_counter() - start, tokens_in=estimate_tokens(text), tokens_out=estimate_tokens(compacted))
+    return compacted
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+from crewai import Agent, Task
+from langchain_groq import ChatGroq
+from instrumentation import llm_tracer
+from routing import RoutedChatModel
+from rate_limit import RateLimitedChatModel, groq_rate_limiter
+
+# Map the `llm` names used in agents_and_tasks.json to Groq model names
+MODEL_NAMES = {
+    'groq_llm_70b': 'llama3-70b-8192',
+    'groq_llm_8b': 'llama3-8b-8192',
+}
+
+# `llm` names that route every turn between a small and a large model, and whether final answers start small
+ROUTED_MODELS = {
+    'groq_llm_routed': ('groq_llm_8b', 'groq_llm_70b', False),
+    'groq_llm_routed_summary': ('groq_llm_8b', 'groq_llm_70b', True),
+}
+
+_llm_clients = {}
+_llm_lock = threading.Lock()
+
+
+def create_groq_llm(model_name: str):
+    """Create a ChatGroq client for the given Groq model name."""
+    groq_api_key = os.environ.get('GROQ_API_KEY')
+    if not groq_api_key:
+        raise ValueError("API Key for Groq is not set in environment variables")
+    # Retries are left to RateLimitedChatModel, which backs off for all clients of the model at once
+    return ChatGroq(temperature=0, groq_api_key=groq_api_key, model_name=model_name, max_retries=0)
+
+
+# Factory used to create a client the first time a model name is requested
+llm_factory = create_groq_llm
+
+
+def get_llm(llm_name: str):
+    """
+    Return the shared LLM client for an `llm` name from agents_and_tasks.json.
+
+    Every agent configured with the same model shares one client instead of
+    constructing its own on every request, and every request goes through the
+    process-wide Groq rate limiter. The returned copy reports to the run
+    instrumentation.
+
+    Args:
+    llm_name (str): A key of MODEL_NAMES or ROUTED_MODELS, or a raw Groq model name.
+
+    Returns:
+    The shared client for that model, or a RoutedChatModel over two of them.
+    """
+    if llm_name in ROUTED_MODELS:
+        small, large, small_answers = ROUTED_MODELS[llm_name]
+        # The routed model's requests are traced by the clients it forwards them to
+        return RoutedChatModel(small=get_llm(small), large=get_llm(large), small_answers=small_answers)
+    model_name = MODEL_NAMES.get(llm_name, llm_name)
+    with _llm_lock:
+        client = _llm_clients.get(model_name)
+        if client is None:
+            client = RateLimitedChatModel(model=llm_factory(model_name), limiter=groq_rate_limiter, model_name=model_name)
+            _llm_clients[model_name] = client
+    # CrewAI appends a token counter to the callbacks of every agent's LLM, so each
+    # agent gets a shallow copy that shares the connection pool but not the callbacks.
+    # pydantic's copy() would drop excluded fields such as the HTTP client.
+    return type(client).construct(_fields_set=client.__fields_set__, **dict(client.__dict__, callbacks=[llm_tracer]))
+
+
+def set_llm_factory(factory):
+    """Replace the client factory and drop the clients created so far."""
+    global llm_factory
+    with _llm_lock:
+        llm_factory = factory
+        _llm_clients.clear()
+
+
+def with_context(description: str, context: str) -> str:
+    """
+    Append the output of upstream tasks to a task description.
+
+    Braces are escaped because CrewAI formats descriptions with the kickoff
+    inputs, and upstream output may contain literal braces.
+    """
+    if not context:
+        return description
+    escaped = context.replace('{', '{{').replace('}', '}}')
+    return f"{description}\n\nThis is the output of the previous agents, use it as context:\n{escaped}"
+
+
+class AgentRegistry:
+    """
+    Parsed view of agents_and_tasks.json that is shared between requests.
+
+    The file is parsed once and only re-read when its modification time
+    changes and its content hash differs from the loaded copy. Agent and Task
+    objects are built per request, and only for the roles that were selected,
+    because CrewAI keeps per-run state on both.
+    """
+
+    def __init__(self, file_path: str, tools: dict):
+        """
+        Args:
+        file_path (str): Path to the agents and tasks JSON file.
+        tools (dict): Mapping of the tool names used in the file to tool objects.
+        """
+        self.file_path = file_path
+        self.tools = tools
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._digest = None
+        self._agents = {}
+
+    def _reload_if_changed(self):
+        mtime = os.stat(self.file_path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with open(self.file_path, 'rb') as file:
+            raw = file.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest != self._digest:
+            data = json.loads(raw)
+            agents = {}
+            for agent_data in data['agents']:
+                missing = [name for name in agent_data['tools'] if name not in self.tools]
+                if missing:
+                    raise ValueError(f"Unknown tools for agent '{agent_data['role']}': {', '.join(missing)}")
+                agents[agent_data['role']] = agent_data
+            self._agents = agents
+            self._digest = digest
+        self._mtime = mtime
+
+    def _snapshot(self):
+        with self._lock:
+            self._reload_if_changed()
+            return self._agents, self._digest
+
+    @property
+    def config_hash(self) -> str:
+        """SHA-256 of the currently loaded configuration file."""
+        return self._snapshot()[1]
+
+    def roles(self) -> list:
+        """Return the configured agent roles in file order."""
+        return list(self._snapshot()[0])
+
+    def agent_configs(self) -> list:
+        """Return the raw JSON entries of all agents in file order."""
+        return list(self._snapshot()[0].values())
+
+    def agent_config(self, role: str) -> dict:
+        """Return the raw JSON entry for a role."""
+        agents, _ = self._snapshot()
+        if role not in agents:
+            raise KeyError(f"Unknown agent role: {role}")
+        return agents[role]
+
+    def build(self, roles: list, context: str = None):
+        """
+        Build fresh Agent and Task objects for the selected roles.
+
+        Args:
+        roles (list): The agent roles to build, in execution order.
+        context (str): Optional upstream output passed to every task.
+
+        Returns:
+        tuple: The list of agents and the list of their tasks.
+        """
+        agents = []
+        tasks = []
+        for role in roles:
+            agent_data = self.agent_config(role)
+            # A task with its own `llm` gets its own copy of the agent
+            role_agents = {}
+            for task_data in agent_data['tasks']:
+                llm_name = task_data.get('llm', agent_data['llm'])
+                if llm_name not in role_agents:
+                    role_agents[llm_name] = self._build_agent(agent_data, llm_name)
+                    agents.append(role_agents[llm_name])
+                tasks.append(Task(
+                    description=with_context(task_data['description'], context),
+                    expected_output=task_data['expected_output'],
+                    agent=role_agents[llm_name]
+                ))
+            if not role_agents:
+                agents.append(self._build_agent(agent_data, agent_data['llm']))
+        return agents, tasks
+
+    def _build_agent(self, agent_data: dict, llm_name: str):
+        return Agent(
+            role=agent_data['role'],
+            goal=agent_data['goal'],
+            tools=[self.tools[tool_name] for tool_name in agent_data['tools']],
+            llm=get_llm(llm_name),
+            backstory=agent_data['backstory'],
+            allow_delegation=agent_data['allow_delegation'],
+            max_iter=agent_data['max_iter'],
+            verbose=agent_data['verbose'],
+        )
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# SQLite file holding scraped pages and their indexed chunks
+DOC_STORE_PATH = os.environ.get('DOC_STORE_PATH', os.path.join('.cache', 'docs.sqlite3'))
+# Seconds a scraped page is served from the store instead of being fetched again
+DOC_STORE_MAX_AGE = float(os.environ.get('DOC_STORE_MAX_AGE', str(7 * 24 * 60 * 60)))
+# sentence-transformers model used for embeddings; empty uses the hashed TF-IDF fallback
+DOC_STORE_MODEL = os.environ.get('DOC_STORE_MODEL', '')
+# Size of an indexed chunk, in characters
+DOC_CHUNK_CHARS = int(os.environ.get('DOC_CHUNK_CHARS', '1000'))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def chunk_text(text: str, chunk_chars: int = DOC_CHUNK_CHARS, overlap: int = 150) -> list:
+    """Split text into overlapping windows of about `chunk_chars` characters, cut at whitespace."""
+    text = ' '.join(text.split())
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            space = text.rfind(' ', start + chunk_chars // 2, end)
+            end = space if space > 0 else end
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(start + 1, end - overlap)
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < end else start
+    return [chunk for chunk in chunks if chunk]
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's whitespace- and case-normalized text."""
+    return hashlib.sha256(' '.join(text.casefold().split()).encode()).hexdigest()
+
+
+class HashingEmbedder:
+    """
+    Dependency-free TF-IDF embeddings.
+
+    Words and word pairs are hashed into a fixed number of dimensions, so
+    stored vectors stay valid as the corpus grows; the inverse document
+    frequencies are applied at search time.
+    """
+
+    uses_idf = True
+
+    def __init__(self, dimensions: int = 2048):
+        self.dimensions = dimensions
+        self.name = f"hashing-tfidf-{dimensions}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD.findall(text.casefold())
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                vectors[row, zlib.crc32(term.encode()) % self.dimensions] += 1
+        np.log1p(vectors, out=vectors)
+        return vectors
+
+
+class SentenceEmbedder:
+    """Embeddings from a local sentence-transformers model, loaded on first use."""
+
+    uses_idf = False
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.name = f"sentence-transformers:{model_name}"
+        self._model = None
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list) -> np.ndarray:
+        with self._lock:
+            if self._model is None:
+                self._model = SentenceTransformer(self.model_name, device='cpu')
+        return np.asarray(self._model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+def default_embedder():
+    """The sentence-transformers model named by DOC_STORE_MODEL when available, else hashed TF-IDF."""
+    if DOC_STORE_MODEL and SentenceTransformer is not None:
+        return SentenceEmbedder(DOC_STORE_MODEL)
+    return HashingEmbedder()
+
+
+class DocStore:
+    """
+    Persistent store of scraped pages with a vector index over their chunks.
+
+    Every page keeps its text and fetch time, so a fresh page never has to be
+    fetched again. Its text is split into chunks, which are embedded and
+    searched by brute-force cosine similarity over an in-memory matrix. Every
+    page keeps its own chunks; a chunk another page already has reuses that
+    page's embedding, and identical chunks are returned as one hit.
+    """
+
+    def __init__(self, path: str = DOC_STORE_PATH, max_age: float = DOC_STORE_MAX_AGE, embedder=None, clock=time.time):
+        """
+        Args:
+        path (str): SQLite file for pages and chunks.
+        max_age (float): Seconds a page counts as fresh.
+        embedder: Object with `name`, `uses_idf` and `embed(texts)`; defaults to default_embedder().
+        clock (callable): Returns the current time in seconds.
+        """
+        self.max_age = max_age
+        self.embedder = embedder or default_embedder()
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._chunk_ids = []
+        self._chunk_hashes = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, display_url TEXT NOT NULL, text TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, url TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, embedder TEXT NOT NULL, embedding BLOB NOT NULL, UNIQUE (url, content_hash))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_url ON chunks (url)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_content_hash ON chunks (content_hash)")
+        self._db.commit()
+
+    def get_fresh(self, url: str):
+        """Return the stored text of a page fetched within `max_age`, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM pages WHERE url = ? AND fetched_at >= ?", (url, self.clock() - self.max_age)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add(self, url: str, text: str, display_url: str = None):
+        """
+        Store a freshly fetched page and index its chunks.
+
+        An unchanged page only has its fetch time updated; chunks that are
+        already indexed (from this or any other page) are not stored again.
+
+        Args:
+        url (str): The canonical URL of the page.
+        text (str): The extracted page text.
+        display_url (str): The URL as it was requested, shown in search results.
+        """
+        page_hash = content_hash(text)
+        now = self.clock()
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, display_url, text, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, display_url or url, text, page_hash, now)
+            )
+            if row and row[0] == page_hash:
+                self._db.commit()
+                return
+            # Only this page's chunks are replaced; other pages keep theirs even when they share text
+            self._db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self._index_page(url, text)
+            self._db.commit()
+            # The in-memory index is rebuilt on the next search
+            self._matrix = None
+
+    def _index_page(self, url: str, text: str):
+        # Chunks the page already has are kept; chunks stored for another page reuse its embedding
+        stored = {chunk_hash for chunk_hash, in self._db.execute("SELECT content_hash FROM chunks WHERE url = ?", (url,))}
+        rows = []
+        missing = []
+        for position, chunk in enumerate(chunk_text(text)):
+            chunk_hash = content_hash(chunk)
+            if chunk_hash in stored:
+                continue
+            stored.add(chunk_hash)
+            embedding = self._db.execute(
+                "SELECT embedding FROM chunks WHERE content_hash = ? AND embedder = ? LIMIT 1", (chunk_hash, self.embedder.name)
+            ).fetchone()
+            rows.append([url, position, chunk, chunk_hash, self.embedder.name, embedding[0] if embedding else None])
+            if not embedding:
+                missing.append(rows[-1])
+        if missing:
+            for row, vector in zip(missing, self.embedder.embed([row[2] for row in missing])):
+                row[5] = vector.tobytes()
+        self._db.executemany(
+            "INSERT INTO chunks (url, position, text, content_hash, embedder, embedding) VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def _index(self):
+        # Chunks embedded by another embedder are embedded again before they are searched
+        stale = self._db.execute("SELECT id, text FROM chunks WHERE embedder != ?", (self.embedder.name,)).fetchall()
+        if stale:
+            vectors = self.embedder.embed([text for _, text in stale])
+            self._db.executemany("UPDATE chunks SET embedder = ?, embedding = ? WHERE id = ?",
+                                 [(self.embedder.name, vector.tobytes(), chunk_id) for (chunk_id, _), vector in zip(stale, vectors)])
+            self._db.commit()
+        rows = self._db.execute("SELECT id, content_hash, embedding FROM chunks ORDER BY id").fetchall()
+        self._chunk_ids = [chunk_id for chunk_id, _, _ in rows]
+        self._chunk_hashes = [chunk_hash for _, chunk_hash, _ in rows]
+        self._matrix = np.vstack([np.frombuffer(embedding, dtype=np.float32) for _, _, embedding in rows]) if rows else None
+
+    def search(self, query: str, k: int = 5) -> list:
+        """
+        Find the indexed chunks most similar to a query.
+
+        Returns:
+        list: Dicts with the chunk `text`, its page `url`, `fetched_at` and `score`, best first.
+        """
+        with self._lock:
+            if self._matrix is None:
+                self._index()
+            if self._matrix is None:
+                return []
+            matrix = self._matrix
+            query_vector = self.embedder.embed([query])[0]
+            if self.embedder.uses_idf:
+                document_frequency = np.count_nonzero(matrix, axis=0)
+                idf = np.log((1 + len(matrix)) / (1 + document_frequency)) + 1
+                matrix = matrix * idf
+                query_vector = query_vector * idf
+            norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1)
+            scores = matrix @ query_vector / np.where(norms == 0, 1, norms)
+            results = []
+            seen = set()
+            for index in np.argsort(-scores, kind='stable'):
+                if len(results) >= k or scores[index] <= 0:
+                    break
+                # A passage several pages share is returned once
+                if self._chunk_hashes[index] in seen:
+                    continue
+                seen.add(self._chunk_hashes[index])
+                text, url, fetched_at = self._db.execute(
+                    "SELECT chunks.text, pages.display_url, pages.fetched_at FROM chunks JOIN pages ON pages.url = chunks.url WHERE chunks.id = ?",
+                    (self._chunk_ids[index],)
+                ).fetchone()
+                results.append({'text': text, 'url': url, 'fetched_at': fetched_at, 'score': float(scores[index])})
+            return results
+
+    def search_to_text(self, query: str, k: int = 5) -> str:
+        """Search the store and format the results as one tool answer."""
+        results = self.search(query, k)
+        if not results:
+            return "No stored pages match this query; search the web instead."
+        now = self.clock()
+        return '\n\n'.join(f"## {result['url']} (scraped {(now - result['fetched_at']) / 3600:.0f} h ago)\n{result['text']}" for result in results)
+
+    def stats(self) -> dict:
+        """Number of stored pages and indexed chunks."""
+        with self._lock:
+            pages, = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()
+            chunks, = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return {'pages': pages, 'chunks': chunks}
+
+
+# Document store shared by the scraper and the retrieval tool of every entry point
+doc_store = DocStore()
@@ -0,0 +1,76 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from progress import cancellable
+
+# Maximum number of role crews that run at the same time
+MAX_CONCURRENT_ROLES = int(os.environ.get('MAX_CONCURRENT_ROLES', '4'))
+# Seconds a single role crew may run before its result is given up on
+ROLE_TIMEOUT = float(os.environ.get('ROLE_TIMEOUT', '600'))
+
+
+class RoleTimeoutError(Exception):
+    """Raised in place of a result when a role did not finish in time."""
+
+
+def run_roles_concurrently(run_role, roles: list, max_workers: int = None, timeout: float = None) -> list:
+    """
+    Run one callable per role on a bounded thread pool.
+
+    The timeout of a role counts from the moment a worker picks it up, so roles
+    waiting for a free worker are not penalised. A role that times out is
+    told to stop: it raises RunCancelled at its next agent step or LLM
+    request, so it stops spending quota, and its result is dropped.
+
+    Args:
+    run_role (callable): Called with a role, returns that role's result.
+    roles (list): The roles to run.
+    max_workers (int): Concurrency cap, defaults to MAX_CONCURRENT_ROLES.
+    timeout (float): Per-role timeout in seconds, defaults to ROLE_TIMEOUT.
+
+    Returns:
+    list: One entry per role, in the order of `roles`. Each entry is the
+    role's result or the exception it raised (RoleTimeoutError on timeout).
+    """
+    max_workers = max_workers or MAX_CONCURRENT_ROLES
+    timeout = ROLE_TIMEOUT if timeout is None else timeout
+    if not roles:
+        return []
+
+    started = {}
+    stops = [threading.Event() for _ in roles]
+
+    def run(index, role):
+        started[index] = time.monotonic()
+        with cancellable(stops[index]):
+            return run_role(role)
+
+    results = [None] * len(roles)
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(roles)))
+    try:
+        # Each role runs in a copy of the caller's context so the run trace follows it
+        futures = {executor.submit(contextvars.copy_context().run, run, index, role): index for index, role in enumerate(roles)}
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            deadlines = [started[futures[future]] + timeout for future in pending if futures[future] in started]
+            # Roles that have not been picked up yet are re-checked shortly
+            wait_for = max(0.0, min(deadlines) - now) if deadlines else 0.05
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+            now = time.monotonic()
+            for future in list(pending):
+                index = futures[future]
+                if index in started and now - started[index] >= timeout:
+                    results[index] = RoleTimeoutError(f"{roles[index]} did not finish within {timeout:g} seconds")
+                    stops[index].set()
+                    pending.discard(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
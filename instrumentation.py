@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Directory receiving one JSONL trace file per run
+TRACE_DIR = os.environ.get('TRACE_DIR', os.path.join('.cache', 'traces'))
+# Prometheus text file rewritten after every run (for the node_exporter textfile collector)
+METRICS_PATH = os.environ.get('METRICS_PATH', os.path.join('.cache', 'metrics.prom'))
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Process-wide counters rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._values = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> str:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        described = set()
+        for (name, labels), value in values:
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str = METRICS_PATH):
+        """Atomically rewrite the metrics file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Every writer gets its own temporary file, since runs finish on several threads at once
+        descriptor, temporary = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp', dir=directory or '.')
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                file.write(self.render())
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+
+metrics = Metrics()
+metrics.describe('report_runs_total', "Crew runs by final status.")
+metrics.describe('report_run_seconds_total', "Wall time spent in crew runs.")
+metrics.describe('report_task_seconds_total', "Wall time spent per task.")
+metrics.describe('report_llm_requests_total', "LLM requests by model.")
+metrics.describe('report_llm_seconds_total', "Wall time spent waiting for the LLM, by model.")
+metrics.describe('report_llm_tokens_total', "LLM tokens by model and type.")
+metrics.describe('report_llm_errors_total', "Failed LLM requests by model.")
+metrics.describe('report_tool_calls_total', "Tool calls by tool.")
+metrics.describe('report_tool_seconds_total', "Wall time spent in tools.")
+metrics.describe('report_tool_errors_total', "Failed tool calls by tool.")
+metrics.describe('report_cache_hits_total', "Tool calls answered from a cache.")
+
+
+class RunTrace:
+    """Spans recorded during one crew run."""
+
+    def __init__(self, name: str, run_id: str = None):
+        self.name = name
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def record(self, kind: str, name: str, duration: float, **attrs):
+        span = {'run_id': self.run_id, 'kind': kind, 'name': name,
+                'offset': round(time.perf_counter() - self._start - duration, 4), 'duration': round(duration, 4)}
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """Aggregate the spans by kind and name."""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        def entry_for(key):
+            return totals.setdefault(key, {'count': 0, 'seconds': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0, 'errors': 0, 'cache_hits': 0, 'retries': 0})
+
+        for span in spans:
+            entry = entry_for((span['kind'], span['name']))
+            if span['kind'] == 'retry':
+                # Retries are also counted on the model's LLM row
+                entry_for(('llm', span['name']))['retries'] += 1
+                entry['retries'] += 1
+            entry['count'] += 1
+            entry['seconds'] += span['duration']
+            entry['prompt_tokens'] += span.get('prompt_tokens', 0)
+            entry['completion_tokens'] += span.get('completion_tokens', 0)
+            entry['errors'] += 1 if span.get('error') else 0
+            entry['cache_hits'] += 1 if span.get('cache_hit') else 0
+        return totals
+
+    def summary_markdown(self) -> str:
+        """Timing table for the UI."""
+        lines = [
+            f"**Run `{self.run_id}` timing** ({time.perf_counter() - self._start:.1f} s total)",
+            "",
+            "| Kind | Name | Calls | Seconds | Prompt tokens | Completion tokens | Errors | Retries | Cache hits |",
+            "|---|---|---|---|---|---|---|---|---|",
+        ]
+        for (kind, name), entry in sorted(self.summary().items()):
+            lines.append(f"| {kind} | {name} | {entry['count']} | {entry['seconds']:.1f} | {entry['prompt_tokens']} | "
+                         f"{entry['completion_tokens']} | {entry['errors']} | {entry['retries']} | {entry['cache_hits']} |")
+        routing = self.routing_summary()
+        if routing['turns']:
+            lines += ["", f"**Model routing:** {routing['turns']} turns, {routing['small']} on the small model, "
+                          f"{routing['escalated']} escalated · estimated cost ${routing['cost_usd']:.4f} vs "
+                          f"${routing['baseline_cost_usd']:.4f} on the large model only (saved ${routing['saved_usd']:.4f}, "
+                          f"about {routing['saved_seconds']:.1f} s)"]
+        return '\n'.join(lines)
+
+    def routing_summary(self) -> dict:
+        """Totals of the `route` spans recorded by routed chat models."""
+        with self._lock:
+            spans = [span for span in self.spans if span['kind'] == 'route']
+        cost = sum(span.get('cost_usd', 0.0) for span in spans)
+        baseline = sum(span.get('baseline_cost_usd', 0.0) for span in spans)
+        return {
+            'turns': len(spans),
+            'small': sum(1 for span in spans if span['name'] == 'small'),
+            'escalated': sum(1 for span in spans if span['name'].startswith('escalated')),
+            'cost_usd': cost,
+            'baseline_cost_usd': baseline,
+            'saved_usd': baseline - cost,
+            'saved_seconds': sum(span.get('saved_seconds', 0.0) for span in spans),
+        }
+
+    def write(self, directory: str = TRACE_DIR) -> str:
+        """Write the run header and every span as JSON lines; returns the file path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.jsonl")
+        with open(path, 'w') as file:
+            file.write(json.dumps({'run_id': self.run_id, 'kind': 'run', 'name': self.name, 'started_at': self.started_at,
+                                   'duration': round(time.perf_counter() - self._start, 4)}) + '\n')
+            with self._lock:
+                for span in self.spans:
+                    file.write(json.dumps(span) + '\n')
+        return path
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_run(name: str, run_id: str = None):
+    """
+    Trace everything that runs in this context (and in worker threads started
+    with a copy of it). On exit the trace file and the metrics file are written.
+    """
+    trace = RunTrace(name, run_id)
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    status = 'failed'
+    try:
+        yield trace
+        status = 'done'
+    finally:
+        _current_trace.reset(token)
+        metrics.inc('report_runs_total', entry=name, status=status)
+        metrics.inc('report_run_seconds_total', time.perf_counter() - start, entry=name)
+        # Trace and metrics files are diagnostics; failing to write them must not fail the run
+        try:
+            trace.write()
+            metrics.write()
+        except OSError:
+            logger.exception("Could not write the trace or metrics of run %s", trace.run_id)
+
+
+def record(kind: str, name: str, duration: float, **attrs):
+    """Record a finished span on the current trace, if there is one."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(kind, name, duration, **attrs)
+
+
+def annotate(**attrs):
+    """Attach attributes (e.g. cache_hit=True) to the innermost open span."""
+    span = _current_span.get()
+    if span is not None:
+        span.update(attrs)
+
+
+def traced_tool(name: str):
+    """Decorator recording the latency, errors and cache hits of a tool function."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            attrs = {}
+            token = _current_span.set(attrs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                attrs['error'] = True
+                metrics.inc('report_tool_errors_total', tool=name)
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                _current_span.reset(token)
+                metrics.inc('report_tool_calls_total', tool=name)
+                metrics.inc('report_tool_seconds_total', duration, tool=name)
+                if attrs.get('cache_hit'):
+                    metrics.inc('report_cache_hits_total', tool=name)
+                record('tool', name, duration, **attrs)
+        return wrapper
+    return decorator
+
+
+class LLMTracer(BaseCallbackHandler):
+    """LangChain callback recording latency, token usage and failures of every LLM request."""
+
+    def __init__(self):
+        self._started = {}
+
+    def _start(self, run_id, kwargs):
+        params = kwargs.get('invocation_params') or {}
+        self._started[run_id] = (time.perf_counter(), params.get('model') or params.get('model_name') or 'unknown')
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        self._start(run_id, kwargs)
+
+    def _finish(self, run_id, **attrs):
+        start, model = self._started.pop(run_id, (None, 'unknown'))
+        duration = time.perf_counter() - start if start is not None else 0.0
+        metrics.inc('report_llm_requests_total', model=model)
+        metrics.inc('report_llm_seconds_total', duration, model=model)
+        record('llm', model, duration, **attrs)
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        llm_output = response.llm_output or {}
+        usage = llm_output.get('token_usage') or {}
+        if not usage and response.generations and response.generations[0]:
+            message = getattr(response.generations[0][0], 'message', None)
+            usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        model = self._started.get(run_id, (None, 'unknown'))[1]
+        metrics.inc('report_llm_tokens_total', prompt_tokens, model=model, type='prompt')
+        metrics.inc('report_llm_tokens_total', completion_tokens, model=model, type='completion')
+        self._finish(run_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        metrics.inc('report_llm_errors_total', model=self._started.get(run_id, (None, 'unknown'))[1])
+        self._finish(run_id, error=True, message=str(error)[:200])
+
+
+# Callback handler attached to every LLM client
+llm_tracer = LLMTracer()
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from progress import RunProgress
+from instrumentation import trace_run
+
+# Crew runs executed at the same time by a job queue
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# SQLite file holding job state and results
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join('.cache', 'jobs.sqlite3'))
+# Seconds between status updates while a job is followed in the UI
+JOB_POLL_INTERVAL = 0.5
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+
+class JobQueue:
+    """
+    Background queue that runs crew kickoffs on a worker pool.
+
+    Submitting returns a job ID straight away. Every job is traced with
+    instrumentation.trace_run under its job ID. Job arguments, state, progress
+    log, timing summary and result are stored in SQLite, so a job can be looked up again after
+    the UI reloads, and `resume` restarts the jobs that were still waiting or
+    running when the process stopped.
+    """
+
+    def __init__(self, name: str, runner, path: str = JOB_DB_PATH, workers: int = JOB_WORKERS):
+        """
+        Args:
+        name (str): Separates the jobs of different entry points in one file.
+        runner (callable): Called as runner(*args, progress=RunProgress); returns the result text.
+        path (str): SQLite file for the job table.
+        workers (int): Number of jobs run at the same time.
+        """
+        self.name = name
+        self.runner = runner
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._logs = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, queue TEXT NOT NULL, args TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, log TEXT NOT NULL DEFAULT '[]', "
+            "submitted_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        try:
+            # Job tables created before run timing summaries were recorded
+            self._db.execute("ALTER TABLE jobs ADD COLUMN summary TEXT")
+        except sqlite3.OperationalError:
+            pass
+        self._db.commit()
+
+    def resume(self):
+        """Queue the jobs left waiting or running by a previous process again."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE queue = ? AND status IN (?, ?) ORDER BY submitted_at",
+                (self.name, QUEUED, RUNNING)
+            ).fetchall()
+            self._db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE queue = ? AND status = ?", (QUEUED, self.name, RUNNING))
+            self._db.commit()
+        for job_id, in rows:
+            self._executor.submit(self._run, job_id)
+
+    def _update(self, job_id: str, **fields):
+        columns = ', '.join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def submit(self, *args) -> str:
+        """Queue a run with the given runner arguments and return its job ID."""
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, queue, args, status, submitted_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, self.name, json.dumps(args), QUEUED, time.time())
+            )
+            self._db.commit()
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT args, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[1] != QUEUED:
+                return
+            progress = RunProgress()
+            self._progress[job_id] = progress
+            self._logs[job_id] = []
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        trace = None
+        try:
+            with trace_run(self.name, run_id=job_id) as trace:
+                result = self.runner(*json.loads(row[0]), progress=progress)
+            fields = {'status': CANCELLED if progress.cancelled else DONE, 'result': str(result)}
+        except Exception as e:
+            fields = {'status': CANCELLED if progress.cancelled else FAILED, 'error': str(e)}
+        log = self._collect_log(job_id)
+        summary = trace.summary_markdown() if trace is not None else None
+        self._update(job_id, log=json.dumps(log), summary=summary, finished_at=time.time(), **fields)
+        with self._lock:
+            self._progress.pop(job_id, None)
+            self._logs.pop(job_id, None)
+
+    def _collect_log(self, job_id: str) -> list:
+        with self._lock:
+            progress = self._progress.get(job_id)
+            if progress is None:
+                return None
+            self._logs[job_id].extend(progress.drain())
+            return list(self._logs[job_id])
+
+    def get(self, job_id: str):
+        """
+        Return the state of a job.
+
+        Returns:
+        dict: Job fields including its progress log, or None for unknown IDs.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, result, error, log, summary, submitted_at, started_at, finished_at FROM jobs WHERE id = ? AND queue = ?",
+                ((job_id or '').strip(), self.name)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'status', 'result', 'error', 'log', 'summary', 'submitted_at', 'started_at', 'finished_at'), row))
+        live_log = self._collect_log(job['id'])
+        job['log'] = live_log if live_log is not None else json.loads(job['log'])
+        if job['status'] == QUEUED:
+            with self._lock:
+                job['position'] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = ? AND submitted_at <= ?",
+                    (self.name, QUEUED, job['submitted_at'])
+                ).fetchone()[0]
+        return job
+
+    def cancel(self, job_id: str):
+        """Cancel a waiting job, or stop a running one at its next agent step."""
+        job_id = (job_id or '').strip()
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?", (CANCELLED, time.time(), job_id, QUEUED))
+            self._db.commit()
+            progress = self._progress.get(job_id)
+        if progress is not None:
+            progress.cancel()
+
+    def stats(self) -> dict:
+        """Queue depth, running jobs and the average wait and run time of finished jobs."""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status", (self.name,)).fetchall())
+            wait_time, run_time = self._db.execute(
+                "SELECT AVG(started_at - submitted_at), AVG(finished_at - started_at) FROM jobs "
+                "WHERE queue = ? AND started_at IS NOT NULL AND finished_at IS NOT NULL",
+                (self.name,)
+            ).fetchone()
+        return {
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'cancelled': counts.get(CANCELLED, 0),
+            'avg_wait_seconds': wait_time or 0.0,
+            'avg_run_seconds': run_time or 0.0,
+        }
+
+    def stats_markdown(self) -> str:
+        stats = self.stats()
+        return (f"Queue: {stats['queued']} waiting, {stats['running']} running, {stats['done']} done, {stats['failed']} failed"
+                f" · average wait {stats['avg_wait_seconds']:.0f} s · average run {stats['avg_run_seconds']:.0f} s")
+
+
+def render_job(job: dict) -> str:
+    """Render a job's status, progress log and result as markdown."""
+    if job is None:
+        return "Unknown job ID."
+    log = "\n\n".join(job['log'])
+    if job['summary']:
+        log = f"{log}\n\n{job['summary']}"
+    if job['status'] == DONE:
+        return f"{job['result']}\n\n<details><summary>Run log and timings</summary>\n\n{log}\n\n</details>"
+    if job['status'] == QUEUED:
+        header = f"Job `{job['id']}` is waiting in the queue (position {job['position']})."
+    elif job['status'] == RUNNING:
+        header = f"Job `{job['id']}` is running for {time.time() - job['started_at']:.0f} s."
+    elif job['status'] == FAILED:
+        header = f"Job `{job['id']}` failed: {job['error']}"
+    else:
+        header = f"Job `{job['id']}` was cancelled."
+    return f"{header}\n\n{log}" if log else header
+
+
+async def follow_job(jobs: JobQueue, job_id: str):
+    """Yield the rendered state of a job whenever it changes, until the job has finished."""
+    rendered = None
+    while True:
+        job = jobs.get(job_id)
+        update = render_job(job)
+        if update != rendered:
+            rendered = update
+            yield update
+        if job is None or job['status'] not in (QUEUED, RUNNING):
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
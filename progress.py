@@ -0,0 +1,116 @@
+import contextvars
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from instrumentation import metrics, record
+
+_cancel_event = contextvars.ContextVar('cancel_event', default=None)
+
+
+class RunCancelled(Exception):
+    """Raised inside a crew run after the user cancelled it or it ran out of time."""
+
+
+@contextmanager
+def cancellable(event: threading.Event):
+    """Let `event` stop the work done in this context at its next agent step or LLM request."""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def raise_if_cancelled():
+    """Raise RunCancelled when the work running in this context was told to stop."""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise RunCancelled("Run stopped because it ran out of time")
+
+
+class RunProgress:
+    """
+    Collects progress events of a crew run from CrewAI callbacks.
+
+    Crews running in worker threads report through `crew_callbacks`, which
+    also records step and task timings on the current run trace; the UI side
+    drains the collected markdown lines with `drain`. Setting `cancel`
+    makes the next agent step raise RunCancelled.
+    """
+
+    def __init__(self):
+        self._events = queue.Queue()
+        self._cancelled = threading.Event()
+        self.started_at = time.monotonic()
+
+    def emit(self, text: str):
+        """Record one markdown line, prefixed with the time since the run started."""
+        self._events.put(f"`{time.monotonic() - self.started_at:6.1f}s` {text}")
+
+    def drain(self) -> list:
+        """Return the lines recorded since the previous call."""
+        lines = []
+        while True:
+            try:
+                lines.append(self._events.get_nowait())
+            except queue.Empty:
+                return lines
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def crew_callbacks(self, labels: list) -> dict:
+        """
+        Build the step and task callbacks for one Crew.
+
+        Args:
+        labels (list): A display name for each of the crew's tasks, in order.
+
+        Returns:
+        dict: Keyword arguments for Crew(...).
+        """
+        position = {'task': 0, 'task_started': time.perf_counter(), 'step_started': time.perf_counter()}
+        self.emit(f"**{labels[0]}** started")
+
+        def current_label():
+            return labels[min(position['task'], len(labels) - 1)]
+
+        def step_callback(step_output):
+            if self.cancelled:
+                raise RunCancelled("Run cancelled by the user")
+            raise_if_cancelled()
+            name = current_label()
+            now = time.perf_counter()
+            record('step', name, now - position['step_started'])
+            position['step_started'] = now
+            if isinstance(step_output, list):
+                for step in step_output:
+                    action = step[0] if isinstance(step, tuple) else step.action
+                    self.emit(f"{name} used tool *{action.tool}* with `{str(action.tool_input)[:200]}`")
+            elif hasattr(step_output, 'return_values'):
+                self.emit(f"{name} produced an answer")
+
+        def task_callback(task_output):
+            label = current_label()
+            now = time.perf_counter()
+            record('task', label, now - position['task_started'])
+            metrics.inc('report_task_seconds_total', now - position['task_started'], task=label)
+            position['task_started'] = position['step_started'] = now
+            output = getattr(task_output, 'raw_output', None) or str(task_output)
+            self.emit(f"**{label}** finished\n\n<details><summary>{label} output</summary>\n\n{output}\n\n</details>\n")
+            position['task'] += 1
+            if position['task'] < len(labels):
+                self.emit(f"**{labels[position['task']]}** started")
+
+        return {'step_callback': step_callback, 'task_callback': task_callback}
+
+
+def task_labels(tasks: list) -> list:
+    """Display names for a crew's tasks: the agent role, numbered when a role has several tasks."""
+    roles = [task.agent.role for task in tasks]
+    return [role if roles.count(role) == 1 else f"{role} ({roles[:index + 1].count(role)}/{roles.count(role)})" for index, role in enumerate(roles)]
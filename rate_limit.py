@@ -0,0 +1,287 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from langchain_core.language_models.chat_models import BaseChatModel
+from instrumentation import metrics, record
+from progress import raise_if_cancelled
+from routing import token_usage
+
+# Groq limits per model as (requests per minute, tokens per minute)
+GROQ_LIMITS = {
+    'llama3-70b-8192': (30, 6000),
+    'llama3-8b-8192': (30, 30000),
+}
+# Limits of models missing from GROQ_LIMITS
+DEFAULT_LIMITS = (30, 6000)
+# Overrides of the per-model limits for every model; 0 disables that limit
+GROQ_RPM = os.environ.get('GROQ_RPM')
+GROQ_TPM = os.environ.get('GROQ_TPM')
+# Retries of a request that was rate limited or failed transiently
+GROQ_MAX_RETRIES = int(os.environ.get('GROQ_MAX_RETRIES', '5'))
+# Backoff before the first retry and the longest backoff, in seconds
+GROQ_BACKOFF_BASE = float(os.environ.get('GROQ_BACKOFF_BASE', '1'))
+GROQ_BACKOFF_MAX = float(os.environ.get('GROQ_BACKOFF_MAX', '60'))
+# Completion tokens reserved for a request that sets no max_tokens; corrected once the usage is known
+COMPLETION_TOKENS_ESTIMATE = 500
+
+INTERACTIVE, BATCH = 'interactive', 'batch'
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+metrics.describe('report_rate_limit_wait_seconds_total', "Time LLM requests waited for the client-side rate limit, by model and priority.")
+metrics.describe('report_rate_limit_retries_total', "LLM requests retried after a rate limit or transient error, by model and status.")
+
+_priority = contextvars.ContextVar('rate_limit_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: str):
+    """Run LLM requests made in this context (and in worker threads started with a copy of it) at a priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a steady rate per minute.
+
+    Not thread-safe on its own; ModelLimiter guards its buckets with one lock.
+    A request larger than the bucket waits for a full bucket and then leaves
+    it in debt, which later requests wait off.
+    """
+
+    def __init__(self, per_minute: float, capacity: float, now: float):
+        self.per_minute = per_minute
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens can be taken; 0 when they can be taken now."""
+        if self.per_minute <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+        needed = min(amount, self.capacity)
+        # The tolerance keeps rounding errors from producing waits too short to move the clock
+        return 0.0 if self.tokens >= needed - 1e-6 else (needed - self.tokens) * 60 / self.per_minute
+
+    def take(self, amount: float):
+        if self.per_minute > 0:
+            self.tokens -= amount
+
+
+class ModelLimiter:
+    """
+    Request and token buckets of one model, shared by every client of that model.
+
+    Batch requests only take from the buckets while no interactive request is
+    waiting. After a rate limit error every request waits out the backoff.
+    """
+
+    def __init__(self, model_name: str, rpm: float, tpm: float, clock=time.monotonic, sleep=time.sleep, poll: float = 0.25):
+        self.model_name = model_name
+        self.clock = clock
+        self.sleep = sleep
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._blocked_until = 0.0
+        self.set_limits(rpm, tpm)
+
+    def set_limits(self, rpm: float, tpm: float):
+        with self._lock:
+            now = self.clock()
+            # A sixth of a minute's requests may burst; a single request may use a minute's tokens
+            self.requests = TokenBucket(rpm, max(1.0, rpm / 6), now)
+            self.tokens = TokenBucket(tpm, tpm, now)
+
+    def acquire(self, tokens: float, level: str = None) -> float:
+        """
+        Wait until one request of about `tokens` tokens may be sent.
+
+        Returns:
+        float: Seconds spent waiting.
+        """
+        level = level or _priority.get()
+        waited = 0.0
+        with self._lock:
+            self._waiting[level] += 1
+        try:
+            while True:
+                with self._lock:
+                    now = self.clock()
+                    delay = max(0.0, self._blocked_until - now)
+                    if not delay and level == BATCH and self._waiting[INTERACTIVE]:
+                        delay = self.poll
+                    if not delay:
+                        delay = max(self.requests.delay(1, now), self.tokens.delay(tokens, now))
+                    if not delay:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                # Wake up at least every poll interval so a waiting batch request notices interactive ones
+                delay = min(delay, self.poll) if level == BATCH else delay
+                self.sleep(delay)
+                waited += delay
+        finally:
+            with self._lock:
+                self._waiting[level] -= 1
+        if waited:
+            metrics.inc('report_rate_limit_wait_seconds_total', waited, model=self.model_name, priority=level)
+            record('throttle', self.model_name, waited, priority=level)
+        return waited
+
+    def settle(self, estimated: float, actual: float):
+        """Correct the token bucket once the real usage of a request is known."""
+        with self._lock:
+            self.tokens.take(actual - estimated)
+
+    def back_off(self, seconds: float):
+        """Hold every request to this model for `seconds`."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self.clock() + seconds)
+
+
+class RateLimiter:
+    """Process-wide registry of one ModelLimiter per model name."""
+
+    def __init__(self, limits: dict = GROQ_LIMITS, clock=time.monotonic, sleep=time.sleep, jitter=random.random):
+        """
+        Args:
+        limits (dict): Model name to (requests per minute, tokens per minute).
+        clock (callable): Returns the current time in seconds.
+        sleep (callable): Waits the given number of seconds.
+        jitter (callable): Returns a random float in [0, 1) used to spread retries.
+        """
+        self.limits = dict(limits)
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.rpm = float(GROQ_RPM) if GROQ_RPM else None
+        self.tpm = float(GROQ_TPM) if GROQ_TPM else None
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def _limits(self, model_name: str) -> tuple:
+        rpm, tpm = self.limits.get(model_name, DEFAULT_LIMITS)
+        return (rpm if self.rpm is None else self.rpm), (tpm if self.tpm is None else self.tpm)
+
+    def for_model(self, model_name: str) -> ModelLimiter:
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = ModelLimiter(model_name, *self._limits(model_name), clock=self.clock, sleep=self.sleep)
+            return self._models[model_name]
+
+    def set_limits(self, rpm: float = None, tpm: float = None):
+        """Override the requests and/or tokens per minute of every model; 0 disables a limit."""
+        with self._lock:
+            self.rpm = self.rpm if rpm is None else rpm
+            self.tpm = self.tpm if tpm is None else tpm
+            for model_name, limiter in self._models.items():
+                limiter.set_limits(*self._limits(model_name))
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based): the server's retry-after or a jittered exponential delay."""
+        if retry_after is not None:
+            return retry_after + self.jitter() * min(1.0, retry_after * 0.1)
+        return min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * 2 ** attempt) * (0.5 + self.jitter() / 2)
+
+
+def error_status(error: Exception):
+    """HTTP status of an API error, or None for connection errors and other exceptions."""
+    status = getattr(error, 'status_code', None)
+    response = getattr(error, 'response', None)
+    return status if status is not None else getattr(response, 'status_code', None)
+
+
+def is_retryable(error: Exception) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+
+def retry_after(error: Exception):
+    """The retry-after header of an API error in seconds, if the server sent one."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    value = headers.get('retry-after')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def estimate_tokens(messages: list, max_tokens: int = None) -> int:
+    """Prompt tokens (about four characters each) plus the completion tokens the request may use."""
+    prompt = sum(len(str(message.content)) for message in messages) // 4 + 1
+    return prompt + (max_tokens or COMPLETION_TOKENS_ESTIMATE)
+
+
+# Rate limits shared by every Groq client in the process
+groq_rate_limiter = RateLimiter()
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    Chat model that sends every request of the wrapped model through the shared rate limiter.
+
+    Requests wait for their model's request and token buckets. Rate limit
+    errors and transient failures are retried with jittered exponential
+    backoff (or the server's retry-after), during which every request to that
+    model waits as well.
+    """
+
+    model: BaseChatModel
+    limiter: RateLimiter
+    model_name: str = ''
+    max_retries: int = GROQ_MAX_RETRIES
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.model._identifying_params
+
+    def _combine_llm_outputs(self, llm_outputs: list) -> dict:
+        return self.model._combine_llm_outputs(llm_outputs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter = self.limiter.for_model(self.model_name)
+        estimated = estimate_tokens(messages, kwargs.get('max_tokens') or getattr(self.model, 'max_tokens', None))
+        attempt = 0
+        while True:
+            # A role that ran out of time stops here instead of spending more quota
+            raise_if_cancelled()
+            limiter.acquire(estimated)
+            try:
+                # Checked again since the wait for the limiter may have been long
+                raise_if_cancelled()
+                result = self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                # A rejected request is not counted against the quota by the server
+                limiter.settle(estimated, 0)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                status = str(error_status(e) or type(e).__name__)
+                delay = self.limiter.backoff(attempt, retry_after(e))
+                metrics.inc('report_rate_limit_retries_total', model=self.model_name, status=status)
+                # The backoff is recorded as the span's duration, so retries show up in the run trace and timing table
+                record('retry', self.model_name, delay, status=status, attempt=attempt + 1)
+                limiter.back_off(delay)
+                attempt += 1
+                continue
+            usage = token_usage(result)
+            if usage:
+                limiter.settle(estimated, usage.get('total_tokens') or usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+            return result
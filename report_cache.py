@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from search_cache import normalize_query
+
+# Seconds a finished report is served from the cache
+REPORT_CACHE_MAX_AGE = float(os.environ.get('REPORT_CACHE_MAX_AGE', str(24 * 60 * 60)))
+# Minimum trigram similarity for a stored topic to count as the same topic
+REPORT_CACHE_SIMILARITY = float(os.environ.get('REPORT_CACHE_SIMILARITY', '0.8'))
+# SQLite file holding the finished reports
+REPORT_CACHE_PATH = os.environ.get('REPORT_CACHE_PATH', os.path.join('.cache', 'reports.sqlite3'))
+
+
+def config_key(*parts) -> str:
+    """Hash the parts that identify an agent/task configuration."""
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+_STOPWORDS = set("a an and are as at be by for from in into is it of on or the this that to with about how what why".split())
+
+
+def content_words(text: str) -> set:
+    """Words of a normalized topic that carry meaning: no stopwords, plurals folded."""
+    words = re.findall(r'[a-z0-9]+', text)
+    return {word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+            for word in words if word not in _STOPWORDS}
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of a normalized topic, padded so short topics still have some."""
+    padded = f"  {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(a: set, b: set) -> float:
+    """Jaccard similarity of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class CachedReport:
+    """A report found in the cache, with the topic it was produced for."""
+
+    def __init__(self, topic: str, report: str, age: float):
+        self.topic = topic
+        self.report = report
+        self.age = age
+
+    def markdown(self) -> str:
+        minutes = int(self.age // 60)
+        age = f"{minutes // 60} h {minutes % 60} min" if minutes >= 60 else f"{minutes} min"
+        return (f"{self.report}\n\n---\n*Served from the report cache: researched as \"{self.topic}\" {age} ago. "
+                "Tick 'Force refresh' to research it again.*")
+
+
+class ReportCache:
+    """
+    Finished reports keyed on the normalized topic and a configuration hash.
+
+    Exact topic matches are looked up directly; otherwise the fresh topics
+    stored for the same configuration are compared by trigram similarity and
+    the closest one above `threshold` with the same content words is
+    returned, so only spelling, word order, stopwords and plurals may differ.
+    """
+
+    def __init__(self, path: str, max_age: float = REPORT_CACHE_MAX_AGE, threshold: float = REPORT_CACHE_SIMILARITY, clock=time.time):
+        self.max_age = max_age
+        self.threshold = threshold
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._index = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "config_hash TEXT NOT NULL, topic TEXT NOT NULL, display_topic TEXT NOT NULL, "
+            "report TEXT NOT NULL, stored_at REAL NOT NULL, PRIMARY KEY (config_hash, topic))"
+        )
+        self._db.commit()
+
+    def _topics(self, config_hash: str) -> dict:
+        # Similarity index of the stored topics, loaded once per configuration
+        if config_hash not in self._index:
+            rows = self._db.execute("SELECT topic FROM reports WHERE config_hash = ?", (config_hash,)).fetchall()
+            self._index[config_hash] = {topic: trigrams(topic) for topic, in rows}
+        return self._index[config_hash]
+
+    def lookup(self, topic: str, config_hash: str):
+        """
+        Find a fresh report for the topic or a near-duplicate of it.
+
+        Returns:
+        CachedReport or None.
+        """
+        normalized = normalize_query(topic)
+        oldest = self.clock() - self.max_age
+        with self._lock:
+            candidates = [normalized]
+            if normalized not in self._topics(config_hash):
+                wanted = trigrams(normalized)
+                words = content_words(normalized)
+                scored = sorted(((similarity(wanted, grams), stored) for stored, grams in self._topics(config_hash).items()), reverse=True)
+                # Long topics share most trigrams even when a word (or a year) differs, so those words must match too
+                candidates = [stored for score, stored in scored if score >= self.threshold and content_words(stored) == words]
+            for candidate in candidates:
+                row = self._db.execute(
+                    "SELECT display_topic, report, stored_at FROM reports WHERE config_hash = ? AND topic = ? AND stored_at >= ?",
+                    (config_hash, candidate, oldest)
+                ).fetchone()
+                if row is not None:
+                    display_topic, report, stored_at = row
+                    return CachedReport(display_topic, report, self.clock() - stored_at)
+        return None
+
+    def store(self, topic: str, config_hash: str, report: str):
+        """Store a finished report, replacing an older one for the same topic."""
+        normalized = normalize_query(topic)
+        now = self.clock()
+        with self._lock:
+            # Reports past the freshness window are never served again
+            expired = self._db.execute("SELECT config_hash, topic FROM reports WHERE stored_at < ?", (now - self.max_age,)).fetchall()
+            self._db.execute("DELETE FROM reports WHERE stored_at < ?", (now - self.max_age,))
+            for expired_hash, expired_topic in expired:
+                self._index.get(expired_hash, {}).pop(expired_topic, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO reports (config_hash, topic, display_topic, report, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (config_hash, normalized, topic.strip(), report, now)
+            )
+            self._db.commit()
+            self._topics(config_hash)[normalized] = trigrams(normalized)
+
+
+# Report cache shared by the entry points
+report_cache = ReportCache(REPORT_CACHE_PATH)
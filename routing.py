@@ -0,0 +1,162 @@
+import ast
+import json
+import re
+import threading
+import time
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+from instrumentation import metrics, record
+
+# Groq list prices in USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    'llama3-70b-8192': (0.59, 0.79),
+    'llama3-8b-8192': (0.05, 0.08),
+}
+
+metrics.describe('report_routing_turns_total', "Routed LLM turns by route.")
+metrics.describe('report_routing_cost_usd_total', "Estimated cost of routed LLM turns.")
+metrics.describe('report_routing_baseline_cost_usd_total', "Estimated cost of the same turns on the large model only.")
+metrics.describe('report_routing_saved_seconds_total', "Estimated LLM wait time saved by routing.")
+
+SMALL, LARGE, ESCALATED_FINAL, ESCALATED_INVALID = 'small', 'large', 'escalated_final', 'escalated_invalid'
+
+# Shortest final answer of the small model that is not escalated to the large model
+MIN_FINAL_ANSWER_CHARS = 20
+
+# Moving average of the seconds per request of every model, used to estimate time saved
+_latency = {}
+_latency_lock = threading.Lock()
+
+
+def model_name_of(model) -> str:
+    return getattr(model, 'model_name', None) or getattr(model, 'model', None) or type(model).__name__
+
+
+def token_usage(result) -> dict:
+    """Token usage of an LLMResult or ChatResult, from llm_output or the message metadata."""
+    usage = (result.llm_output or {}).get('token_usage') or {}
+    if not usage and result.generations:
+        generation = result.generations[0]
+        generation = generation[0] if isinstance(generation, list) and generation else generation
+        message = getattr(generation, 'message', None)
+        usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+    return usage
+
+
+def cost(model_name: str, usage: dict) -> float:
+    """Estimated cost in USD of one request, 0 for models without a known price."""
+    prompt_price, completion_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    return (usage.get('prompt_tokens', 0) * prompt_price + usage.get('completion_tokens', 0) * completion_price) / 1_000_000
+
+
+def _observe_latency(model_name: str, seconds: float):
+    with _latency_lock:
+        previous = _latency.get(model_name)
+        _latency[model_name] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+
+def _expected_latency(model_name: str):
+    with _latency_lock:
+        return _latency.get(model_name)
+
+
+def offered_tools(prompt: str) -> list:
+    """Names of the tools CrewAI offers the agent in this prompt."""
+    offered = re.search(r"only one name of \[(.*?)\]", prompt)
+    return [name.strip() for name in offered.group(1).split(',') if name.strip()] if offered else []
+
+
+def is_valid_action(text: str, tool_names: list) -> bool:
+    """Whether the output is a single, parseable call of an offered tool."""
+    if 'Final Answer:' in text:
+        return False
+    action = re.search(r"Action\s*\d*\s*:[\s]*(.*?)[\s]*Action\s*\d*\s*Input\s*\d*\s*:[\s]*(.*)", text, re.DOTALL)
+    if not action or action.group(1).strip().strip('"\'*') not in tool_names:
+        return False
+    tool_input = action.group(2).strip().strip('`')
+    # JSON first, since literal_eval rejects true/false/null
+    try:
+        return isinstance(json.loads(tool_input), dict)
+    except ValueError:
+        pass
+    try:
+        return isinstance(ast.literal_eval(tool_input), dict)
+    except (ValueError, SyntaxError):
+        return False
+
+
+def is_valid_final_answer(text: str) -> bool:
+    """Whether the output is a final answer with some substance after the marker."""
+    if 'Final Answer:' not in text:
+        return False
+    return len(text.split('Final Answer:', 1)[1].strip()) >= MIN_FINAL_ANSWER_CHARS
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Chat model that sends each agent turn to a small or a large model.
+
+    Turns of agents with tools go to the small model first. A tool call from
+    the small model is used as is; a final answer or output CrewAI cannot
+    parse is thrown away and the turn is asked again of the large model.
+    Other turns only produce the final synthesis, so they go to the large
+    model directly, unless `small_answers` is set: then final answers (for
+    summarizing and rewriting roles) are also taken from the small model and
+    only escalated when they are missing or empty. Every turn is recorded as
+    a `route` span with its estimated cost, the cost on the large model alone
+    and the time saved.
+    """
+
+    small: BaseChatModel
+    large: BaseChatModel
+    small_answers: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return 'routed-chat'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'model_name': f"routed:{model_name_of(self.small)}/{model_name_of(self.large)}"}
+
+    def _call(self, model, messages, stop):
+        start = time.perf_counter()
+        result = model.generate([messages], stop=stop)
+        duration = time.perf_counter() - start
+        _observe_latency(model_name_of(model), duration)
+        return result, duration, token_usage(result)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        start = time.perf_counter()
+        prompt = '\n'.join(str(message.content) for message in messages)
+        tool_names = offered_tools(prompt)
+        large_name = model_name_of(self.large)
+        spent = 0.0
+        baseline = 0.0
+        saved_seconds = 0.0
+        route = LARGE
+        result = None
+        if tool_names or self.small_answers:
+            small_result, duration, usage = self._call(self.small, messages, stop)
+            spent += cost(model_name_of(self.small), usage)
+            text = small_result.generations[0][0].text
+            if is_valid_action(text, tool_names) or (self.small_answers and is_valid_final_answer(text)):
+                route = SMALL
+                result = small_result
+                baseline = cost(large_name, usage)
+                expected = _expected_latency(large_name)
+                saved_seconds = expected - duration if expected is not None else 0.0
+            else:
+                # With small_answers a final answer was allowed, so only an empty one gets here
+                route = ESCALATED_FINAL if 'Final Answer:' in text and not self.small_answers else ESCALATED_INVALID
+                saved_seconds = -duration
+        if result is None:
+            result, _, usage = self._call(self.large, messages, stop)
+            spent += cost(large_name, usage)
+            baseline = cost(large_name, usage)
+        metrics.inc('report_routing_turns_total', route=route)
+        metrics.inc('report_routing_cost_usd_total', spent)
+        metrics.inc('report_routing_baseline_cost_usd_total', baseline)
+        metrics.inc('report_routing_saved_seconds_total', saved_seconds)
+        record('route', route, time.perf_counter() - start, cost_usd=spent, baseline_cost_usd=baseline, saved_seconds=saved_seconds)
+        return ChatResult(generations=result.generations[0], llm_output=result.llm_output)
@@ -0,0 +1,144 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from executor import MAX_CONCURRENT_ROLES
+
+
+class PipelineCycleError(ValueError):
+    """Raised when the agent graph contains a cycle."""
+
+
+class UpstreamFailedError(Exception):
+    """Stored as the result of a role whose upstream role failed."""
+
+
+def build_dependencies(agent_configs: list) -> dict:
+    """
+    Build the dependency graph of the configured agents.
+
+    An agent's `next_agent` makes that agent depend on it, and an optional
+    `depends_on` list names the agents it waits for directly.
+
+    Args:
+    agent_configs (list): Agent entries from agents_and_tasks.json.
+
+    Returns:
+    dict: Maps every role to the set of roles it depends on.
+    """
+    dependencies = {agent_data['role']: set() for agent_data in agent_configs}
+    for agent_data in agent_configs:
+        role = agent_data['role']
+        next_agent = agent_data.get('next_agent')
+        if next_agent:
+            if next_agent not in dependencies:
+                raise ValueError(f"Agent '{role}' has unknown next_agent '{next_agent}'")
+            dependencies[next_agent].add(role)
+        for upstream in agent_data.get('depends_on', []):
+            if upstream not in dependencies:
+                raise ValueError(f"Agent '{role}' depends on unknown agent '{upstream}'")
+            dependencies[role].add(upstream)
+    return dependencies
+
+
+def topological_order(dependencies: dict, roles: list = None) -> list:
+    """
+    Order roles so that every role comes after the roles it depends on.
+
+    Ties are broken by the order of `roles` (or of `dependencies` when no
+    roles are given).
+
+    Raises:
+    PipelineCycleError: If the graph contains a cycle.
+    """
+    roles = list(dependencies) if roles is None else roles
+    position = {role: index for index, role in enumerate(roles)}
+    remaining = {role: set(dependencies[role]) & set(roles) for role in roles}
+    order = []
+    while remaining:
+        ready = sorted((role for role, upstream in remaining.items() if not upstream), key=position.get)
+        if not ready:
+            raise PipelineCycleError(f"Agent pipeline contains a cycle between: {', '.join(sorted(remaining))}")
+        for role in ready:
+            del remaining[role]
+            order.append(role)
+        for upstream in remaining.values():
+            upstream.difference_update(ready)
+    return order
+
+
+def select_dependencies(dependencies: dict, roles: list) -> dict:
+    """
+    Restrict the graph to the selected roles.
+
+    A selected role whose upstream role was not selected inherits that role's
+    own selected upstream roles, so ordering is preserved across the gap.
+    """
+    selected = set(roles)
+    for role in roles:
+        if role not in dependencies:
+            raise KeyError(f"Unknown agent role: {role}")
+
+    def nearest_selected(role, seen):
+        found = set()
+        for upstream in dependencies[role]:
+            if upstream in seen:
+                continue
+            seen.add(upstream)
+            if upstream in selected:
+                found.add(upstream)
+            else:
+                found |= nearest_selected(upstream, seen)
+        return found
+
+    return {role: nearest_selected(role, {role}) for role in roles}
+
+
+def run_pipeline(run_node, dependencies: dict, roles: list, max_workers: int = None) -> dict:
+    """
+    Run the selected roles in dependency order on a bounded thread pool.
+
+    Roles whose upstream roles have all finished are started together, so
+    independent branches run in parallel. When a role fails, the roles that
+    depend on it are not run and get an UpstreamFailedError instead.
+
+    Args:
+    run_node (callable): Called as run_node(role, upstream) where upstream maps
+        each direct upstream role to its result; returns the role's result.
+    dependencies (dict): The full graph from build_dependencies.
+    roles (list): The selected roles.
+    max_workers (int): Concurrency cap, defaults to MAX_CONCURRENT_ROLES.
+
+    Returns:
+    dict: Role to result (or the exception it raised), in topological order.
+    """
+    graph = select_dependencies(dependencies, roles)
+    order = topological_order(graph, roles)
+    results = {}
+    waiting = list(order)
+    running = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers or MAX_CONCURRENT_ROLES)
+    try:
+        while waiting or running:
+            for role in list(waiting):
+                upstream = graph[role]
+                if not upstream <= set(results):
+                    continue
+                waiting.remove(role)
+                failed = [name for name in upstream if isinstance(results[name], Exception)]
+                if failed:
+                    results[role] = UpstreamFailedError(f"{role} was skipped because {', '.join(sorted(failed))} failed")
+                    continue
+                inputs = {name: results[name] for name in order if name in upstream}
+                # Each role runs in a copy of the caller's context so the run trace follows it
+                running[executor.submit(contextvars.copy_context().run, run_node, role, inputs)] = role
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                role = running.pop(future)
+                try:
+                    results[role] = future.result()
+                except Exception as e:
+                    results[role] = e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return {role: results[role] for role in order}
@@ -0,0 +1,170 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from bs4 import BeautifulSoup
+from doc_store import doc_store
+from instrumentation import annotate
+from urls import canonical_url, parse_urls
+
+# Pages fetched at the same time across all hosts
+SCRAPE_MAX_WORKERS = int(os.environ.get('SCRAPE_MAX_WORKERS', '8'))
+# Pages fetched at the same time from a single host
+SCRAPE_MAX_PER_HOST = int(os.environ.get('SCRAPE_MAX_PER_HOST', '2'))
+# Seconds to wait for a server to connect and to send data
+SCRAPE_TIMEOUT = float(os.environ.get('SCRAPE_TIMEOUT', '15'))
+# Largest response body that is downloaded, in bytes
+SCRAPE_MAX_BYTES = int(os.environ.get('SCRAPE_MAX_BYTES', str(2 * 1024 * 1024)))
+# Largest amount of extracted text returned per page, in characters
+SCRAPE_MAX_CHARS = int(os.environ.get('SCRAPE_MAX_CHARS', '8000'))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,text/plain;q=0.8,*/*;q=0.5',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+
+def extract_text(html: bytes) -> str:
+    """Extract the visible text of an HTML page."""
+    parsed = BeautifulSoup(html, "html.parser")
+    for element in parsed(['script', 'style', 'noscript', 'svg']):
+        element.decompose()
+    text = parsed.get_text('\n')
+    lines = (' '.join(line.split()) for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+class BatchScraper:
+    """
+    Fetch many pages concurrently over one pooled HTTP session.
+
+    URLs are deduplicated by canonical form and fetched on a bounded thread
+    pool. Each host has its own queue that hands at most `max_per_host` pages
+    to the pool at a time, so a batch from one host never occupies workers
+    that other hosts could use. Downloads are cut off at `max_bytes`. With a
+    document store, pages it holds fresh are served from it and every newly
+    fetched page is added to it.
+    """
+
+    def __init__(self, max_workers: int = SCRAPE_MAX_WORKERS, max_per_host: int = SCRAPE_MAX_PER_HOST,
+                 timeout: float = SCRAPE_TIMEOUT, max_bytes: int = SCRAPE_MAX_BYTES, max_chars: int = SCRAPE_MAX_CHARS,
+                 store=None):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._host_queues = {}
+        self._host_active = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, host: str, fn, *args) -> Future:
+        """Queue a call for a host; it is handed to the pool once the host has a free slot."""
+        future = Future()
+        with self._lock:
+            self._host_queues.setdefault(host, deque()).append((future, fn, args))
+        self._dispatch(host)
+        return future
+
+    def _dispatch(self, host: str):
+        with self._lock:
+            queue = self._host_queues.get(host)
+            if not queue or self._host_active.get(host, 0) >= self.max_per_host:
+                return
+            future, fn, args = queue.popleft()
+            if not queue:
+                del self._host_queues[host]
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+        self._executor.submit(self._run, host, future, fn, args)
+
+    def _run(self, host: str, future: Future, fn, args):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._host_active[host] -= 1
+                if not self._host_active[host]:
+                    del self._host_active[host]
+            # The freed slot goes to the next queued page of the same host
+            self._dispatch(host)
+
+    def fetch(self, url: str) -> dict:
+        """
+        Fetch one page and extract its text.
+
+        Returns:
+        dict: The url and either its `text` or an `error` message.
+        """
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '')
+                if content_type and not content_type.startswith(('text/', 'application/xhtml')):
+                    return {'url': url, 'error': f"unsupported content type {content_type}"}
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=65536):
+                    body += chunk
+                    if len(body) >= self.max_bytes:
+                        del body[self.max_bytes:]
+                        break
+            text = extract_text(bytes(body)) if 'html' in content_type or not content_type else body.decode(response.encoding or 'utf-8', errors='replace')
+            return {'url': url, 'text': text[:self.max_chars]}
+        except Exception as e:
+            return {'url': url, 'error': str(e)}
+
+    def scrape(self, urls) -> list:
+        """
+        Fetch a batch of URLs concurrently.
+
+        Args:
+        urls: A list of URLs or a separated string of URLs.
+
+        Returns:
+        list: One result dict per unique canonical URL, in input order.
+        """
+        unique = {}
+        for url in parse_urls(urls):
+            unique.setdefault(canonical_url(url), url if '://' in url else 'https://' + url)
+        futures = [self._submit(urlsplit(url).netloc, self._fetch_stored, key, url) for key, url in unique.items()]
+        return [future.result() for future in futures]
+
+    def _fetch_stored(self, key: str, url: str) -> dict:
+        if self.store is None:
+            return self.fetch(url)
+        text = self.store.get_fresh(key)
+        if text is not None:
+            return {'url': url, 'text': text, 'stored': True}
+        page = self.fetch(url)
+        if 'text' in page:
+            self.store.add(key, page['text'], display_url=url)
+        return page
+
+    def scrape_to_text(self, urls) -> str:
+        """Fetch a batch of URLs and format the results as one tool answer."""
+        sections = []
+        pages = self.scrape(urls)
+        annotate(cache_hit=any(page.get('stored') for page in pages))
+        for page in pages:
+            if 'error' in page:
+                sections.append(f"## {page['url']}\nCould not scrape this page: {page['error']}")
+            else:
+                sections.append(f"## {page['url']}\n{page['text']}")
+        return '\n\n'.join(sections) or "No URLs were given."
+
+
+# Scraper shared by the scraping tools of every entry point
+scraper = BatchScraper(store=doc_store)
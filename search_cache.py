@@ -0,0 +1,145 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from instrumentation import annotate
+
+# Seconds a cached search result stays valid
+SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', str(6 * 60 * 60)))
+# SQLite file backing the on-disk tier; an empty value keeps the cache in memory only
+SEARCH_CACHE_PATH = os.environ.get('SEARCH_CACHE_PATH', os.path.join('.cache', 'search.sqlite3'))
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that trivially different spellings share a cache entry."""
+    query = query.casefold().strip().strip('"\'')
+    query = re.sub(r'\s+', ' ', query)
+    return query.rstrip(' ?!.')
+
+
+class SearchCache:
+    """
+    Two-tier cache for search tool results.
+
+    Lookups go to an in-memory LRU first and then to a SQLite table. Entries
+    expire after `ttl` seconds; both tiers evict the least recently used (or
+    oldest) entries once they exceed their size limit.
+    """
+
+    def __init__(self, path: str = None, ttl: float = SEARCH_CACHE_TTL, memory_size: int = 256, disk_size: int = 10000, clock=time.time):
+        """
+        Args:
+        path (str): SQLite file for the on-disk tier, or None for memory only.
+        ttl (float): Seconds an entry stays valid.
+        memory_size (int): Maximum number of entries kept in memory.
+        disk_size (int): Maximum number of rows kept on disk.
+        clock (callable): Returns the current time in seconds.
+        """
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.clock = clock
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_stored_at ON search_cache (stored_at)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(namespace: str, query: str) -> str:
+        return f"{namespace}\x1f{normalize_query(query)}"
+
+    def get(self, namespace: str, query: str):
+        """Return the cached result for a query, or None when missing or expired."""
+        key = self.make_key(namespace, query)
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if now - stored_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, stored_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, stored_at = row
+                    if now - stored_at < self.ttl:
+                        self._remember(key, value, stored_at)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, namespace: str, query: str, value: str):
+        """Store a result in both tiers."""
+        key = self.make_key(namespace, query)
+        now = self.clock()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO search_cache (key, value, stored_at) VALUES (?, ?, ?)", (key, value, now))
+                self._db.execute(
+                    "DELETE FROM search_cache WHERE stored_at < ? OR key IN ("
+                    "SELECT key FROM search_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (now - self.ttl, self.disk_size)
+                )
+                self._db.commit()
+
+    def _remember(self, key, value, stored_at):
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_or_fetch(self, namespace: str, query: str, fetch):
+        """
+        Return the cached result for a query, calling `fetch(query)` on a miss.
+
+        Args:
+        namespace (str): Separates the results of different tools.
+        query (str): The search query.
+        fetch (callable): Performs the actual search.
+
+        Returns:
+        The cached or freshly fetched result.
+        """
+        value = self.get(namespace, query)
+        annotate(cache_hit=value is not None)
+        if value is None:
+            value = fetch(query)
+            self.put(namespace, query, value)
+        return value
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters and the number of entries in memory."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+            }
+
+
+# Cache shared by the search tools of every entry point
+search_cache = SearchCache(path=SEARCH_CACHE_PATH or None)
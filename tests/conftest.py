@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the top of the repository, next to the entry points
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The shared stores are created on import; keep them out of the working directory
+_state = tempfile.mkdtemp(prefix='crew-tests-')
+for name, file_name in (('SEARCH_CACHE_PATH', 'search.sqlite3'), ('REPORT_CACHE_PATH', 'reports.sqlite3'),
+                        ('DOC_STORE_PATH', 'docs.sqlite3'), ('CHECKPOINT_PATH', 'checkpoints.sqlite3'),
+                        ('JOB_DB_PATH', 'jobs.sqlite3'), ('TRACE_DIR', 'traces'), ('METRICS_PATH', 'metrics.prom')):
+    os.environ.setdefault(name, os.path.join(_state, file_name))
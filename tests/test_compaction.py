@@ -0,0 +1,33 @@
+from compaction import COMPACT_MIN_NOTES_SHARE, compact_context, estimate_tokens, extract_sources
+
+
+def draft(sources: int) -> str:
+    paragraph = "Grid storage capacity grew while battery prices fell and solar output rose in {year}."
+    return '\n\n'.join(f"{paragraph.format(year=2000 + index % 20)} See [Report {index}](https://site{index % 40}.example.com/report/{index})."
+                       for index in range(sources))
+
+
+def test_text_within_budget_is_unchanged():
+    assert compact_context("Short notes.", 'storage', 1500) == "Short notes."
+
+
+def test_output_stays_within_budget_with_a_few_sources():
+    text = draft(12)
+    compacted = compact_context(text * 20, 'grid storage', 1500)
+    assert estimate_tokens(text * 20) > 1500
+    assert estimate_tokens(compacted) <= 1500
+    assert all(f"https://site{index}.example.com/report/{index}" in compacted for index in range(12))
+
+
+def test_every_source_is_kept_when_the_list_is_long():
+    text = draft(200)
+    compacted = compact_context(text, 'grid storage', 1500)
+    notes, sources = compacted.split("Sources cited upstream:\n")
+    assert sources.splitlines() == [f"- Report {index}: https://site{index % 40}.example.com/report/{index}" for index in range(200)]
+    # The passages keep their minimum share of the budget
+    assert estimate_tokens(notes) >= 1500 * COMPACT_MIN_NOTES_SHARE * 0.9
+
+
+def test_sources_are_deduplicated_by_canonical_url():
+    sources = extract_sources("[Alpha](https://a.com/x) and [Beta](https://b.com/y?utm_source=feed) and https://a.com/x/")
+    assert sources == [('Alpha', 'https://a.com/x'), ('Beta', 'https://b.com/y?utm_source=feed')]
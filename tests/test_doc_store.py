@@ -0,0 +1,49 @@
+from doc_store import DocStore, HashingEmbedder
+
+SHARED = "Perovskite tandem cells reached thirty three percent efficiency in certified laboratory tests last year."
+PAGE_A = "Solar module prices fell sharply as factories expanded output across several regions."
+PAGE_B = "Offshore wind auctions stalled because turbine costs and interest rates rose together."
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+def store(path=':memory:', embedder=None) -> DocStore:
+    return DocStore(path=path, embedder=embedder or HashingEmbedder(), clock=lambda: 1000.0)
+
+
+def test_shared_chunk_survives_a_change_of_the_other_page():
+    docs = store()
+    docs.add('https://a.com', SHARED)
+    docs.add('https://b.com', SHARED)
+    docs.add('https://a.com', PAGE_A)
+    results = docs.search('perovskite tandem efficiency')
+    assert [result['url'] for result in results] == ['https://b.com']
+    assert results[0]['text'] == SHARED
+
+
+def test_shared_chunk_is_embedded_once_and_returned_once():
+    embedder = CountingEmbedder()
+    docs = store(embedder=embedder)
+    docs.add('https://a.com', SHARED)
+    docs.add('https://b.com', SHARED)
+    assert embedder.embedded == 1
+    assert docs.stats() == {'pages': 2, 'chunks': 2}
+    assert len(docs.search('perovskite tandem efficiency')) == 1
+
+
+def test_unchanged_page_is_not_indexed_again():
+    embedder = CountingEmbedder()
+    docs = store(embedder=embedder)
+    docs.add('https://b.com', PAGE_B)
+    docs.add('https://b.com', PAGE_B)
+    assert embedder.embedded == 1
+    assert docs.search('offshore wind auctions')[0]['url'] == 'https://b.com'
+
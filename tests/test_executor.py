@@ -0,0 +1,42 @@
+import threading
+import time
+from executor import RoleTimeoutError, run_roles_concurrently
+from progress import RunCancelled, raise_if_cancelled
+
+
+def test_results_come_back_in_role_order():
+    def run_role(role):
+        time.sleep(0.05 if role == 'a' else 0)
+        if role == 'c':
+            raise ValueError('c failed')
+        return role.upper()
+
+    results = run_roles_concurrently(run_role, ['a', 'b', 'c'], max_workers=3, timeout=5)
+    assert results[:2] == ['A', 'B']
+    assert isinstance(results[2], ValueError)
+
+
+def test_timed_out_role_is_stopped():
+    stopped = threading.Event()
+    steps = []
+
+    def run_role(role):
+        if role == 'fast':
+            return 'done'
+        try:
+            # Stands in for the agent steps and LLM requests of a crew
+            while True:
+                steps.append(role)
+                raise_if_cancelled()
+                time.sleep(0.01)
+        except RunCancelled:
+            stopped.set()
+            raise
+
+    results = run_roles_concurrently(run_role, ['slow', 'fast'], max_workers=2, timeout=0.2)
+    assert results[1] == 'done'
+    assert isinstance(results[0], RoleTimeoutError)
+    assert stopped.wait(1)
+    count = len(steps)
+    time.sleep(0.05)
+    assert len(steps) == count
@@ -0,0 +1,197 @@
+import threading
+import time
+import httpx
+import pytest
+from groq import BadRequestError, InternalServerError, RateLimitError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+import rate_limit
+from rate_limit import BATCH, INTERACTIVE, ModelLimiter, RateLimitedChatModel, RateLimiter, estimate_tokens
+
+MODEL = 'llama3-70b-8192'
+
+
+class FakeClock:
+    """Clock whose sleep advances time instantly; `on_sleep` runs before the first sleep."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.on_sleep = None
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        hook, self.on_sleep = self.on_sleep, None
+        if hook:
+            hook()
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubModel(BaseChatModel):
+    """Chat model that plays back a list of outcomes: exceptions are raised, dicts are returned as token usage."""
+
+    outcomes: list
+    calls: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return 'stub'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(messages)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content='ok'))], llm_output={'token_usage': outcome})
+
+
+def api_error(error_type, status: int, retry_after: str = None):
+    headers = {'retry-after': retry_after} if retry_after else {}
+    response = httpx.Response(status, headers=headers, request=httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions'))
+    return error_type(f"status {status}", response=response, body=None)
+
+
+@pytest.fixture(autouse=True)
+def no_limit_overrides(monkeypatch):
+    # GROQ_RPM/GROQ_TPM in the environment would replace the limits under test
+    monkeypatch.setattr(rate_limit, 'GROQ_RPM', None)
+    monkeypatch.setattr(rate_limit, 'GROQ_TPM', None)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def limited(limiter, outcomes, max_retries=5) -> RateLimitedChatModel:
+    return RateLimitedChatModel(model=StubModel(outcomes=outcomes, calls=[]), limiter=limiter, model_name=MODEL, max_retries=max_retries)
+
+
+def test_requests_per_minute(clock):
+    limiter = ModelLimiter(MODEL, rpm=12, tpm=0, clock=clock, sleep=clock.sleep)
+    # A sixth of a minute's requests (2) may burst, then one request every 5 s
+    assert [limiter.acquire(1) for _ in range(4)] == [0, 0, 5, 5]
+
+
+def test_tokens_per_minute(clock):
+    limiter = ModelLimiter(MODEL, rpm=0, tpm=600, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire(600) == 0
+    assert limiter.acquire(300) == pytest.approx(30)
+    # A request larger than the bucket waits for a full bucket and leaves it in debt
+    assert limiter.acquire(900) == pytest.approx(60)
+    assert limiter.acquire(10) == pytest.approx(31)
+
+
+def test_zero_disables_limits(clock):
+    limiter = ModelLimiter(MODEL, rpm=0, tpm=0, clock=clock, sleep=clock.sleep)
+    assert sum(limiter.acquire(10_000) for _ in range(100)) == 0
+
+
+def test_estimate_is_settled_against_usage(clock):
+    limiter = RateLimiter({MODEL: (0, 10_000)}, clock=clock, sleep=clock.sleep)
+    messages = [HumanMessage(content='x' * 400)]
+    limited(limiter, [{'prompt_tokens': 80, 'completion_tokens': 20, 'total_tokens': 100}]).invoke(messages)
+    assert estimate_tokens(messages) > 100
+    assert limiter.for_model(MODEL).tokens.tokens == pytest.approx(10_000 - 100)
+
+
+def test_failed_request_returns_its_estimate(clock):
+    limiter = RateLimiter({MODEL: (0, 10_000)}, clock=clock, sleep=clock.sleep)
+    with pytest.raises(ValueError):
+        limited(limiter, [ValueError('boom')]).invoke('hello')
+    assert limiter.for_model(MODEL).tokens.tokens == pytest.approx(10_000)
+
+
+def test_retry_after_blocks_every_client_of_the_model(clock):
+    limiter = RateLimiter({MODEL: (0, 0), 'other': (0, 0)}, clock=clock, sleep=clock.sleep, jitter=lambda: 0.0)
+    first = limited(limiter, [api_error(RateLimitError, 429, retry_after='3'), {'total_tokens': 10}])
+    second = limited(limiter, [{'total_tokens': 10}])
+    other = RateLimitedChatModel(model=StubModel(outcomes=[{'total_tokens': 10}], calls=[]), limiter=limiter, model_name='other')
+    started = {}
+
+    def other_clients():
+        # Runs while the first client waits out its backoff
+        started['other'] = (other.invoke('hi'), clock.now)
+        started['second'] = (second.invoke('hi'), clock.now)
+
+    clock.on_sleep = other_clients
+    assert first.invoke('hello').content == 'ok'
+    assert len(first.model.calls) == 2
+    # Other models are not held; the same model is held until the retry-after has passed
+    assert started['other'][1] == 0
+    assert started['second'][1] >= 3
+
+
+def test_gives_up_after_max_retries(clock):
+    limiter = RateLimiter({MODEL: (0, 0)}, clock=clock, sleep=clock.sleep, jitter=lambda: 0.0)
+    model = limited(limiter, [api_error(InternalServerError, 503) for _ in range(5)], max_retries=3)
+    with pytest.raises(InternalServerError):
+        model.invoke('hello')
+    assert len(model.model.calls) == 4
+    # Exponential backoff from GROQ_BACKOFF_BASE: 0.5 + 1 + 2 with zero jitter
+    assert clock.sleeps == pytest.approx([0.5, 1, 2])
+
+
+@pytest.mark.parametrize('error', [ValueError('bad input'), api_error(BadRequestError, 400)])
+def test_non_retryable_errors_are_raised_at_once(clock, error):
+    limiter = RateLimiter({MODEL: (0, 0)}, clock=clock, sleep=clock.sleep)
+    model = limited(limiter, [error, {'total_tokens': 10}])
+    with pytest.raises(type(error)):
+        model.invoke('hello')
+    assert len(model.model.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_backoff_is_capped_and_honours_retry_after():
+    limiter = RateLimiter(jitter=lambda: 1.0)
+    assert limiter.backoff(0) == pytest.approx(1)
+    assert limiter.backoff(20) == pytest.approx(60)
+    assert limiter.backoff(0, retry_after=10) == pytest.approx(11)
+
+
+def test_batch_yields_to_waiting_interactive_requests():
+    # Real time: 10 tokens per second, starting with an empty bucket
+    limiter = ModelLimiter(MODEL, rpm=0, tpm=600, poll=0.01)
+    limiter.acquire(600)
+    order = []
+
+    def request(level):
+        limiter.acquire(5, level)
+        order.append(level)
+
+    batch = threading.Thread(target=request, args=(BATCH,))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=request, args=(INTERACTIVE,))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == [INTERACTIVE, BATCH]
+
+
+def test_cancelled_role_sends_no_request(clock):
+    from progress import RunCancelled, cancellable
+    limiter = RateLimiter({MODEL: (0, 10_000)}, clock=clock, sleep=clock.sleep)
+    model = limited(limiter, [{'total_tokens': 10}])
+    stop = threading.Event()
+    stop.set()
+    with cancellable(stop), pytest.raises(RunCancelled):
+        model.invoke('hello')
+    assert model.model.calls == []
+    assert limiter.for_model(MODEL).tokens.tokens == pytest.approx(10_000)
+
+
+def test_retries_are_recorded_on_the_run_trace(clock):
+    from instrumentation import trace_run
+    limiter = RateLimiter({MODEL: (0, 0)}, clock=clock, sleep=clock.sleep, jitter=lambda: 0.0)
+    model = limited(limiter, [api_error(RateLimitError, 429, retry_after='3'), {'total_tokens': 10}])
+    with trace_run('test') as trace:
+        model.invoke('hello')
+    retries = [span for span in trace.spans if span['kind'] == 'retry']
+    assert [(span['name'], span['duration'], span['status']) for span in retries] == [(MODEL, 3, '429')]
+    assert trace.summary()[('llm', MODEL)]['retries'] == 1
+    assert "| Retries |" in trace.summary_markdown()
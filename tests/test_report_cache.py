@@ -0,0 +1,40 @@
+import pytest
+from report_cache import ReportCache, content_words, similarity, trigrams
+
+
+@pytest.fixture
+def cache():
+    return ReportCache(':memory:', clock=lambda: 1000.0)
+
+
+def test_exact_and_normalized_topics_hit(cache):
+    cache.store('Renewable Energy', 'config', 'report')
+    assert cache.lookup('  renewable energy? ', 'config').report == 'report'
+
+
+def test_spelling_stopwords_and_plurals_hit(cache):
+    cache.store('The impact of artificial intelligence on healthcare jobs', 'config', 'jobs report')
+    assert cache.lookup('impact of artificial intelligence on healthcare job', 'config').report == 'jobs report'
+
+
+def test_topic_differing_in_one_word_misses(cache):
+    stored = 'impact of artificial intelligence on healthcare jobs'
+    query = 'impact of artificial intelligence on healthcare costs'
+    cache.store(stored, 'config', 'jobs report')
+    # The trigram score alone would pass the threshold
+    assert similarity(trigrams(stored), trigrams(query)) >= cache.threshold
+    assert cache.lookup(query, 'config') is None
+
+
+def test_topic_differing_in_a_number_misses(cache):
+    cache.store('state of solar power in 2023', 'config', 'report')
+    assert cache.lookup('state of solar power in 2024', 'config') is None
+
+
+def test_configurations_are_separate(cache):
+    cache.store('renewable energy', 'config', 'report')
+    assert cache.lookup('renewable energy', 'other config') is None
+
+
+def test_content_words():
+    assert content_words('the costs of solar cells in 2024') == {'cost', 'solar', 'cell', '2024'}
@@ -0,0 +1,78 @@
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from routing import ESCALATED_FINAL, ESCALATED_INVALID, LARGE, SMALL, RoutedChatModel, is_valid_action, is_valid_final_answer
+from instrumentation import trace_run
+
+TOOLS_PROMPT = "Action: the action to take, only one name of [DuckDuckGoSearch, WebScrapper], just the name, exactly as it's written."
+ANSWER_PROMPT = "Proofread the draft and give your best complete final answer."
+ACTION = 'Thought: search\nAction: DuckDuckGoSearch\nAction Input: {"search_query": "solar", "safe": true}'
+ANSWER = "Thought: done\nFinal Answer: The proofread draft, with every typo fixed."
+
+
+class ScriptedModel(BaseChatModel):
+    """Chat model that always answers with the same text and counts its calls."""
+
+    model_name: str
+    text: str
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'scripted'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        usage = {'prompt_tokens': 1000, 'completion_tokens': 100, 'total_tokens': 1100}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.text))], llm_output={'token_usage': usage})
+
+
+def route(prompt: str, small_text: str, small_answers: bool = False):
+    small = ScriptedModel(model_name='llama3-8b-8192', text=small_text)
+    large = ScriptedModel(model_name='llama3-70b-8192', text=ANSWER)
+    model = RoutedChatModel(small=small, large=large, small_answers=small_answers)
+    with trace_run('test') as trace:
+        text = model.invoke([HumanMessage(content=prompt)]).content
+    return text, trace.routing_summary(), [span['name'] for span in trace.spans if span['kind'] == 'route'], small.calls, large.calls
+
+
+def test_json_tool_input_is_a_valid_action():
+    assert is_valid_action(ACTION, ['DuckDuckGoSearch'])
+    assert is_valid_action("Action: WebScrapper\nAction Input: {'url': 'https://a.com'}", ['WebScrapper'])
+    assert not is_valid_action("Action: Browser\nAction Input: {}", ['WebScrapper'])
+    assert not is_valid_action("Action: WebScrapper\nAction Input: https://a.com", ['WebScrapper'])
+
+
+def test_final_answer_needs_content():
+    assert is_valid_final_answer(ANSWER)
+    assert not is_valid_final_answer("Final Answer: ok")
+    assert not is_valid_final_answer("I think the draft is fine.")
+
+
+def test_tool_turn_stays_on_the_small_model():
+    text, summary, routes, small_calls, large_calls = route(TOOLS_PROMPT, ACTION)
+    assert (text, routes, small_calls, large_calls) == (ACTION, [SMALL], 1, 0)
+    assert summary['saved_usd'] > 0
+
+
+@pytest.mark.parametrize('small_text, expected', [(ANSWER, ESCALATED_FINAL), ('Action: nothing', ESCALATED_INVALID)])
+def test_tool_turn_escalates(small_text, expected):
+    text, summary, routes, small_calls, large_calls = route(TOOLS_PROMPT, small_text)
+    assert (text, routes, small_calls, large_calls) == (ANSWER, [expected], 1, 1)
+
+
+def test_final_synthesis_goes_to_the_large_model():
+    text, summary, routes, small_calls, large_calls = route(ANSWER_PROMPT, ANSWER)
+    assert (routes, small_calls, large_calls) == ([LARGE], 0, 1)
+
+
+def test_summary_answer_stays_on_the_small_model():
+    small_answer = "Final Answer: Three short posts announcing the report."
+    text, summary, routes, small_calls, large_calls = route(ANSWER_PROMPT, small_answer, small_answers=True)
+    assert (text, routes, small_calls, large_calls) == (small_answer, [SMALL], 1, 0)
+
+
+def test_empty_summary_answer_escalates():
+    text, summary, routes, small_calls, large_calls = route(ANSWER_PROMPT, "Final Answer:", small_answers=True)
+    assert (text, routes, small_calls, large_calls) == (ANSWER, [ESCALATED_INVALID], 1, 1)
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from scraper import BatchScraper
+from urls import canonical_url, parse_urls
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serves /page/<n>, /big (a large text body) and /slow/<seconds>, recording every request."""
+
+    server_version = 'TestServer'
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers['Host'].split(':')[0]
+        path = self.path.split('?')[0]
+        with server.lock:
+            server.requests[path] += 1
+            server.active[host] += 1
+            server.peak[host] = max(server.peak[host], server.active[host])
+            server.started.append((host, self.path, time.monotonic()))
+        try:
+            if path.startswith('/slow/'):
+                time.sleep(float(path.rsplit('/', 1)[1]))
+            if path == '/big':
+                body, content_type = b'x' * 200_000, 'text/plain'
+            else:
+                body, content_type = f"<html><body><p>Page {self.path}</p><script>ignored()</script></body></html>".encode(), 'text/html'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = Counter()
+    server.active = Counter()
+    server.peak = Counter()
+    server.started = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def base(server, host='127.0.0.1') -> str:
+    return f"http://{host}:{server.server_address[1]}"
+
+
+def test_canonical_url():
+    assert canonical_url('HTTPS://Example.com:443/a/?utm_source=x&b=2&a=1#top') == 'https://example.com/a?a=1&b=2'
+    assert canonical_url('example.com') == 'https://example.com/'
+
+
+def test_parse_urls():
+    assert parse_urls("['https://a.com', 'https://b.com']") == ['https://a.com', 'https://b.com']
+    assert parse_urls("https://a.com, https://b.com\nhttps://c.com") == ['https://a.com', 'https://b.com', 'https://c.com']
+
+
+def test_duplicate_urls_are_fetched_once(server):
+    url = f"{base(server)}/page/1"
+    pages = BatchScraper().scrape([url, f"{url}/", f"{url}?utm_source=feed", f"{url}#section"])
+    assert len(pages) == 1
+    assert pages[0]['text'] == 'Page /page/1'
+    assert server.requests['/page/1'] == 1
+
+
+def test_download_is_capped(server):
+    pages = BatchScraper(max_bytes=1000, max_chars=10_000).scrape([f"{base(server)}/big"])
+    assert len(pages[0]['text']) == 1000
+
+
+def test_slow_page_times_out(server):
+    start = time.monotonic()
+    pages = BatchScraper(timeout=0.3).scrape([f"{base(server)}/slow/3", f"{base(server)}/page/2"])
+    assert time.monotonic() - start < 2
+    assert 'error' in pages[0]
+    assert pages[1]['text'] == 'Page /page/2'
+
+
+def test_per_host_limit_does_not_hold_workers(server):
+    scraper = BatchScraper(max_workers=4, max_per_host=1)
+    crowded = [f"{base(server)}/slow/0.2?n={n}" for n in range(6)]
+    other = f"{base(server, 'localhost')}/page/3"
+    pages = scraper.scrape(crowded + [other])
+    assert all('text' in page for page in pages)
+    assert server.peak['127.0.0.1'] == 1
+    # The other host starts with the first wave instead of after the crowded host's queue
+    started = {path: at for host, path, at in server.started}
+    assert started['/page/3'] < sorted(at for host, path, at in server.started if host == '127.0.0.1')[1]
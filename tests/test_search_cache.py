@@ -0,0 +1,111 @@
+import pytest
+from search_cache import SearchCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StubSearch:
+    """Search backend that answers every query and counts the calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, query: str) -> str:
+        self.calls.append(query)
+        return f"results for {query}"
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'search.sqlite3')
+
+
+def test_normalize_query():
+    assert normalize_query('  "Climate   Change?" ') == 'climate change'
+
+
+def test_normalized_queries_share_an_entry(clock):
+    cache = SearchCache(clock=clock)
+    search = StubSearch()
+    assert cache.get_or_fetch('DuckDuckGoSearch', 'Climate Change', search) == 'results for Climate Change'
+    assert cache.get_or_fetch('DuckDuckGoSearch', 'climate change ', search) == 'results for Climate Change'
+    assert search.calls == ['Climate Change']
+
+
+def test_namespaces_are_separate(clock):
+    cache = SearchCache(clock=clock)
+    search = StubSearch()
+    cache.get_or_fetch('DuckDuckGoSearch', 'solar', search)
+    cache.get_or_fetch('DuckDuckGoResults', 'solar', search)
+    assert len(search.calls) == 2
+
+
+def test_memory_entries_expire(clock):
+    cache = SearchCache(ttl=60, clock=clock)
+    cache.put('search', 'solar', 'old')
+    clock.now += 59
+    assert cache.get('search', 'solar') == 'old'
+    clock.now += 1
+    assert cache.get('search', 'solar') is None
+    assert cache.stats()['memory_entries'] == 0
+
+
+def test_disk_entries_expire(clock, path):
+    SearchCache(path=path, ttl=60, clock=clock).put('search', 'solar', 'old')
+    clock.now += 60
+    cache = SearchCache(path=path, ttl=60, clock=clock)
+    assert cache.get('search', 'solar') is None
+    assert cache._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] == 0
+
+
+def test_memory_tier_evicts_least_recently_used(clock):
+    cache = SearchCache(memory_size=2, clock=clock)
+    cache.put('search', 'a', 'A')
+    cache.put('search', 'b', 'B')
+    assert cache.get('search', 'a') == 'A'
+    cache.put('search', 'c', 'C')
+    assert cache.get('search', 'b') is None
+    assert cache.get('search', 'a') == 'A'
+    assert cache.get('search', 'c') == 'C'
+
+
+def test_disk_tier_evicts_oldest_rows(clock, path):
+    cache = SearchCache(path=path, memory_size=1, disk_size=2, clock=clock)
+    for query in ('a', 'b', 'c'):
+        cache.put('search', query, query.upper())
+        clock.now += 1
+    keys = {key for key, in cache._db.execute("SELECT key FROM search_cache")}
+    assert keys == {SearchCache.make_key('search', 'b'), SearchCache.make_key('search', 'c')}
+    assert cache.get('search', 'a') is None
+    assert cache.get('search', 'b') == 'B'
+
+
+def test_hit_and_miss_counters(clock, path):
+    cache = SearchCache(path=path, memory_size=1, clock=clock)
+    search = StubSearch()
+    cache.get_or_fetch('search', 'a', search)
+    cache.get_or_fetch('search', 'a', search)
+    cache.get_or_fetch('search', 'b', search)
+    # 'a' was pushed out of memory by 'b' and comes back from SQLite
+    cache.get_or_fetch('search', 'a', search)
+    assert cache.stats() == {'hits': 2, 'disk_hits': 1, 'misses': 2, 'memory_entries': 1}
+
+
+def test_new_instance_reloads_from_sqlite(clock, path):
+    SearchCache(path=path, clock=clock).put('search', 'Climate Change', 'stored')
+    cache = SearchCache(path=path, clock=clock)
+    search = StubSearch()
+    assert cache.get_or_fetch('search', 'climate change', search) == 'stored'
+    assert search.calls == []
+    assert cache.stats()['disk_hits'] == 1
@@ -0,0 +1,32 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+_DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonicalize a URL for deduplication.
+
+    The scheme and host are lower-cased, default ports, fragments and
+    utm_* tracking parameters are dropped, query parameters are sorted and a
+    trailing slash on the path is removed.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and str(parts.port) != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not key.lower().startswith('utm_')))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def parse_urls(urls) -> list:
+    """Split a tool argument into URLs; accepts a list or a comma/space/newline separated string."""
+    if isinstance(urls, str):
+        urls = re.split(r'[\s,]+', urls.strip().strip('[]'))
+    return [url.strip('\'"<>') for url in urls if url and url.strip('\'"<>')]